@@ -0,0 +1,268 @@
+# backends.py
+"""Платформенная часть скринсейвера: размер экрана, показ и скрытие окна,
+удаление из таскбара, время простоя пользователя и часы главного цикла.
+
+Win32Backend - прежняя реализация через user32, SdlBackend - Linux/X11 и всё
+остальное через SDL (простой берется из расширения XScreenSaver, если оно
+есть), HeadlessBackend - без экрана, с поддельными часами, чтобы главный цикл
+и его замеры шли где угодно. select_backend() выбирает подходящий.
+"""
+import ctypes
+import ctypes.util
+import os
+import sys
+import time
+
+import pygame as pg
+
+class Backend:
+    """Поведение по умолчанию: настоящие часы, простой неизвестен"""
+    name = "base"
+
+    def configure(self):
+        """Вызывается до pg.init(), например чтобы выбрать драйвер SDL"""
+
+    def screen_size(self):
+        sizes = pg.display.get_desktop_sizes()
+        return sizes[0] if sizes else (1920, 1080)
+
+    def prepare_window(self):
+        """Окно создано: убрать его из таскбара и т.п."""
+
+    def show_window(self):
+        pass
+
+    def hide_window(self):
+        pass
+
+    def idle_seconds(self):
+        """Сколько секунд пользователь ничего не трогал во всей системе, None если неизвестно"""
+        return None
+
+    def time(self):
+        return time.time()
+
+    def wait_frame(self, clock, fps):
+        """Ждет следующего кадра"""
+        clock.tick(fps)
+
+    def sleep(self, seconds):
+        """Спит до seconds секунд или до первого события окна (событие остается в очереди)"""
+        timeout = int(seconds * 1000)
+        if timeout <= 0:
+            return
+        event = pg.event.wait(timeout)
+        if event.type != pg.NOEVENT:
+            pg.event.post(event)
+
+class Win32Backend(Backend):
+    name = "win32"
+
+    SW_HIDE = 0
+    SW_MAXIMIZE = 3
+    WS_EX_TOOLWINDOW = 0x00000080
+    GWL_EXSTYLE = -20
+    GWL_STYLE = -16
+    WS_POPUP = 0x80000000
+    SWP_NOSIZE = 0x0001
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+    def __init__(self):
+        # Windows API для мониторинга активности и управления окнами
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+
+    def screen_size(self):
+        return self.user32.GetSystemMetrics(0), self.user32.GetSystemMetrics(1)
+
+    def _hwnd(self):
+        return pg.display.get_wm_info()["window"]
+
+    def prepare_window(self):
+        """Удаляет окно из таскбара"""
+        hwnd = self._hwnd()
+        style = self.user32.GetWindowLongA(hwnd, self.GWL_EXSTYLE)
+        self.user32.SetWindowLongA(hwnd, self.GWL_EXSTYLE, style | self.WS_EX_TOOLWINDOW)
+
+    def hide_window(self):
+        hwnd = self._hwnd()
+        # Полностью скрываем окно
+        self.user32.ShowWindow(hwnd, self.SW_HIDE)
+        # Дополнительно перемещаем его за пределы экрана
+        self.user32.SetWindowPos(hwnd, 0, -32000, -32000, 0, 0, self.SWP_NOSIZE)
+        # Установим минимальный стиль окна, чтобы убрать заголовок и границы
+        self.user32.SetWindowLongA(hwnd, self.GWL_STYLE, self.WS_POPUP)
+
+    def show_window(self):
+        hwnd = self._hwnd()
+        # Восстанавливаем стиль окна, чтобы убрать декорации
+        self.user32.SetWindowLongA(hwnd, self.GWL_STYLE, self.WS_POPUP)
+        # Сначала возвращаем окно на экран, затем показываем и разворачиваем
+        self.user32.SetWindowPos(hwnd, 0, 0, 0, 0, 0, self.SWP_NOSIZE)
+        self.user32.ShowWindow(hwnd, self.SW_MAXIMIZE)
+        self.user32.SetForegroundWindow(hwnd)
+
+    def idle_seconds(self):
+        info = self.LASTINPUTINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if not self.user32.GetLastInputInfo(ctypes.byref(info)):
+            return None
+        # GetTickCount переполняется раз в 49 дней
+        return ((self.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF) / 1000
+
+class XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int), ("kind", ctypes.c_int),
+                ("til_or_since", ctypes.c_ulong), ("idle", ctypes.c_ulong),
+                ("eventMask", ctypes.c_ulong)]
+
+class SdlBackend(Backend):
+    """Linux/X11 и прочие платформы. Окно прячется через SDL, таскбар не трогаем"""
+    name = "sdl"
+
+    def __init__(self):
+        self._window = None
+        self._xss = None
+
+    def _sdl_window(self):
+        if self._window is None:
+            try:
+                from pygame._sdl2.video import Window
+                self._window = Window.from_display_module()
+            except (ImportError, AttributeError, pg.error):
+                self._window = False
+        return self._window
+
+    def hide_window(self):
+        window = self._sdl_window()
+        if window:
+            window.hide()
+        else:
+            pg.display.iconify()
+
+    def show_window(self):
+        window = self._sdl_window()
+        if window:
+            window.show()
+            window.focus()
+
+    def idle_seconds(self):
+        if self._xss is None:
+            self._xss = self._open_xss() or False
+        if not self._xss:
+            return None
+        xss, display, root, info = self._xss
+        if not xss.XScreenSaverQueryInfo(display, root, info):
+            return None
+        return info.contents.idle / 1000
+
+    def _open_xss(self):
+        """Расширение XScreenSaver: время простоя всего X-сервера"""
+        x11_name = ctypes.util.find_library("X11")
+        xss_name = ctypes.util.find_library("Xss")
+        if not (x11_name and xss_name and os.environ.get("DISPLAY")):
+            return None
+        try:
+            x11 = ctypes.CDLL(x11_name)
+            xss = ctypes.CDLL(xss_name)
+        except OSError:
+            return None
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+        xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                              ctypes.POINTER(XScreenSaverInfo)]
+        display = x11.XOpenDisplay(None)
+        if not display:
+            return None
+        return xss, display, x11.XDefaultRootWindow(display), xss.XScreenSaverAllocInfo()
+
+class FakeClock:
+    """Часы, которые идут только когда их двигают"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class RealClock:
+    """Настоящее время с интерфейсом FakeClock: advance() действительно ждет"""
+
+    def time(self):
+        return time.monotonic()
+
+    def advance(self, seconds):
+        time.sleep(seconds)
+
+class HeadlessBackend(Backend):
+    """Без экрана: SDL dummy, поддельные часы, простой задается через input()"""
+    name = "headless"
+
+    def __init__(self, clock=None, size=(1920, 1080)):
+        self.clock = clock or FakeClock()
+        self.size = size
+        self.visible = False
+        self.shown = 0
+        self.hidden = 0
+        self._last_input = self.clock.time()
+
+    def configure(self):
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+    def screen_size(self):
+        return self.size
+
+    def show_window(self):
+        self.visible = True
+        self.shown += 1
+
+    def hide_window(self):
+        self.visible = False
+        self.hidden += 1
+
+    def input(self):
+        """Имитирует действие пользователя в текущий момент"""
+        self._last_input = self.clock.time()
+
+    def idle_seconds(self):
+        return self.clock.time() - self._last_input
+
+    def time(self):
+        return self.clock.time()
+
+    def wait_frame(self, clock, fps):
+        # Кадр длится ровно 1/fps поддельного времени, настоящего ожидания нет
+        self.clock.advance(1 / fps)
+
+    def sleep(self, seconds):
+        self.clock.advance(max(0, seconds))
+
+BACKENDS = {
+    "win32": Win32Backend,
+    "sdl": SdlBackend,
+    "headless": HeadlessBackend,
+}
+
+def select_backend(name=None):
+    """Бэкенд по имени, из переменной SNAKE_BACKEND или по платформе"""
+    name = name or os.environ.get("SNAKE_BACKEND")
+    if name is None:
+        if sys.platform == "win32":
+            name = "win32"
+        elif sys.platform.startswith("linux") and not (os.environ.get("DISPLAY")
+                                                      or os.environ.get("WAYLAND_DISPLAY")):
+            name = "headless"
+        else:
+            name = "sdl"
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный бэкенд {name}, есть: {', '.join(BACKENDS)}")
@@ -0,0 +1,185 @@
+# batch.py
+import random
+import numpy as np
+from simulator import SnakeSimulator, MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL, APPLE_GROWTH, start_snake_cells
+
+class BatchSimulator:
+    """K игр на одном гамильтоновом цикле, все ходят одним векторным шагом.
+
+    Правила те же, что в SnakeSimulator (срезки через will_overtake_tail,
+    рост на apple_growth за яблоко), а яблоко с тем же seed появляется в той же
+    клетке, поэтому каждая игра совпадает с SnakeSimulator(hamilton, seed) ход в ход.
+    Разбившаяся игра не начинается заново, а просто заканчивается.
+    """
+
+    def __init__(self, hamilton, seeds, acceleration_mode=True,
+                 min_distance=MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL, apple_growth=APPLE_GROWTH):
+        index = hamilton.index
+        self.width = w = hamilton.full_w
+        self.height = h = hamilton.full_h
+        self.size = n = w * h
+        self.length = index.length
+        self.acceleration_mode = acceleration_mode
+        self.min_distance = min_distance
+        self.apple_growth = apple_growth
+        self.seeds = list(seeds)
+        self.rngs = [random.Random(seed) for seed in self.seeds]
+        k = self.games = len(self.seeds)
+
+        # Таблицы цикла: клетка <-> позиция, координаты клеток, соседи позиции
+        self.pos_of = np.frombuffer(index.pos_of, dtype=np.int32).astype(np.int64)
+        self.cell_at = np.frombuffer(index.cell_at, dtype=np.int32).astype(np.int64)
+        self.cell_x = np.arange(n) // h
+        self.cell_y = np.arange(n) % h
+        self.neighbors = np.frombuffer(index.neighbors, dtype=np.int32).astype(np.int64).reshape(-1, 4)
+
+        # Тело змейки - кольцевой буфер клеток, head_ptr указывает на голову
+        self.ring = np.zeros((k, n), dtype=np.int32)
+        self.head_ptr = np.full(k, -1, dtype=np.int64)
+        self.tail_ptr = np.zeros(k, dtype=np.int64)
+        self.occupied = np.zeros((k, n), dtype=np.uint8)
+        # Свободные клетки в том же порядке, что и в SnakeBoard
+        self.free = np.tile(np.arange(n, dtype=np.int32), (k, 1))
+        self.free_slot = np.tile(np.arange(n, dtype=np.int32), (k, 1))
+        self.free_count = np.full(k, n, dtype=np.int64)
+
+        self.dir_x = np.ones(k, dtype=np.int64)
+        self.dir_y = np.zeros(k, dtype=np.int64)
+        self.add_count = np.zeros(k, dtype=np.int64)
+        self.apple = np.full(k, -1, dtype=np.int64)
+        self.moves = np.zeros(k, dtype=np.int64)
+        self.active = np.ones(k, dtype=bool)
+        self.crashed = np.zeros(k, dtype=bool)
+
+        everyone = np.arange(k)
+        for x, y in reversed(start_snake_cells(w, h)):
+            self._push_head(everyone, np.full(k, y + h * x, dtype=np.int64))
+        self._spawn_apples(everyone)
+
+    def _push_head(self, games, cells):
+        self.head_ptr[games] = (self.head_ptr[games] + 1) % self.size
+        self.ring[games, self.head_ptr[games]] = cells
+        self.occupied[games, cells] = 1
+
+        # Убираем клетку из свободных: на её место встает последняя свободная
+        slots = self.free_slot[games, cells]
+        last_idx = self.free_count[games] - 1
+        last = self.free[games, last_idx]
+        self.free[games, slots] = last
+        self.free_slot[games, last] = slots
+        self.free_slot[games, cells] = -1
+        self.free_count[games] = last_idx
+
+    def _pop_tail(self, games):
+        cells = self.ring[games, self.tail_ptr[games]]
+        self.tail_ptr[games] = (self.tail_ptr[games] + 1) % self.size
+        self.occupied[games, cells] = 0
+        self.free[games, self.free_count[games]] = cells
+        self.free_slot[games, cells] = self.free_count[games]
+        self.free_count[games] += 1
+
+    def _spawn_apples(self, games):
+        # Яблоки появляются редко, поэтому тут обычный цикл по играм
+        for g in games.tolist():
+            count = int(self.free_count[g])
+            if count:
+                self.apple[g] = self.free[g, self.rngs[g].randrange(count)]
+
+    def step(self):
+        """Один тик для всех активных игр. Возвращает число активных игр"""
+        games = np.flatnonzero(self.active)
+        if games.size == 0:
+            return 0
+        length = self.length
+
+        head_cell = self.ring[games, self.head_ptr[games]].astype(np.int64)
+        tail_cell = self.ring[games, self.tail_ptr[games]].astype(np.int64)
+        head_pos = self.pos_of[head_cell]
+        tail_pos = self.pos_of[tail_cell]
+        apple_pos = np.where(self.apple[games] >= 0, self.pos_of[self.apple[games]], -1)
+
+        # Граница срезки по хвосту (SnakeSimulator.shortcut_limit)
+        margin = self.min_distance + self.add_count[games]
+        limit = np.where((tail_pos - head_pos) % length > margin,
+                         (tail_pos - margin - head_pos) % length, 0)
+        if not self.acceleration_mode:
+            limit[:] = 0
+
+        # Лучший сосед: ближе всех к яблоку по циклу, при равенстве - меньшая позиция
+        nbrs = self.neighbors[head_pos]
+        allowed = (nbrs != -1) & ((nbrs - head_pos[:, None]) % length < limit[:, None])
+        dist = np.where(allowed, (apple_pos[:, None] - nbrs) % length, length)
+        best = np.argmin(dist, axis=1)
+        rows = np.arange(games.size)
+        next_pos = np.where(allowed.any(axis=1), nbrs[rows, best], (head_pos + 1) % length)
+
+        # Направление к выбранной клетке, разворот назад игнорируется
+        next_cell = self.cell_at[next_pos]
+        hx, hy = self.cell_x[head_cell], self.cell_y[head_cell]
+        dx = np.sign(self.cell_x[next_cell] - hx)
+        dy = np.sign(self.cell_y[next_cell] - hy)
+        turn = (dx + self.dir_x[games] != 0) | (dy + self.dir_y[games] != 0)
+        self.dir_x[games] = np.where(turn, dx, self.dir_x[games])
+        self.dir_y[games] = np.where(turn, dy, self.dir_y[games])
+
+        nx = hx + self.dir_x[games]
+        ny = hy + self.dir_y[games]
+        inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+        new_cell = np.where(inside, ny + self.height * nx, 0)
+        crash = ~inside | (self.occupied[games, new_cell] == 1)
+
+        if crash.any():
+            self.crashed[games[crash]] = True
+            self.active[games[crash]] = False
+            games, new_cell = games[~crash], new_cell[~crash]
+
+        self._push_head(games, new_cell)
+        self.moves[games] += 1
+
+        ate = new_cell == self.apple[games]
+        grow = ~ate & (self.add_count[games] > 0)
+        self.add_count[games[ate]] += self.apple_growth
+        self.add_count[games[grow]] -= 1
+        self._pop_tail(games[~ate & ~grow])
+        if ate.any():
+            self._spawn_apples(games[ate])
+
+        # Поле заполнено - игра выиграна
+        self.active[games[self.free_count[games] == 0]] = False
+        return int(self.active.sum())
+
+    def run_until_complete(self, max_moves=None):
+        """Играет все игры до конца.
+
+        Возвращает массив ходов до победы для каждой игры, -1 для игр,
+        которые разбились или не успели за max_moves ходов.
+        """
+        while self.step():
+            if max_moves is not None and self.moves.max() >= max_moves:
+                break
+        return np.where(self.active | self.crashed, -1, self.moves)
+
+def compare_with_scalar(hamilton, seeds, acceleration_mode=True,
+                        min_distance=MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL, apple_growth=APPLE_GROWTH):
+    """Проверяет, что BatchSimulator совпадает с SnakeSimulator для каждого seed.
+
+    Сравнивается число ходов и исход игры (победа или столкновение).
+    Возвращает список seed, на которых результаты разошлись.
+    """
+    batch = BatchSimulator(hamilton, seeds, acceleration_mode, min_distance, apple_growth)
+    batch.run_until_complete()
+    mismatched = []
+    for i, seed in enumerate(seeds):
+        game = SnakeSimulator(hamilton, seed=seed, acceleration_mode=acceleration_mode,
+                              min_distance=min_distance, apple_growth=apple_growth)
+        crashed = False
+        while not game.completed:
+            moves = game.moves
+            if not game.step():
+                crashed = True
+                break
+        else:
+            moves = game.moves
+        if moves != batch.moves[i] or crashed != batch.crashed[i]:
+            mismatched.append(seed)
+    return mismatched
@@ -0,0 +1,502 @@
+# benchmark.py
+"""Замеры производительности скринсейвера.
+
+Запуск: python benchmark.py [--quick] [--output results.json]
+                            [--baseline benchmark_baseline.json] [--threshold 0.2]
+                            [--save-baseline]
+
+Каждый замер - это метрика с единицей измерения и направлением ("lower" или
+"higher" лучше). Результаты пишутся в JSON и сравниваются с сохраненной базой:
+если метрика стала хуже больше чем на threshold, скрипт завершается с кодом 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from hamiltonial import HamiltonianCycle, SPANNING_TREES
+from board import SnakeBoard
+from simulator import SnakeSimulator, PLANNERS, REPAIR_PLANNERS
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.2
+
+def metric(name, value, unit, better="lower"):
+    return {"name": name, "value": value, "unit": unit, "better": better}
+
+def best_time(fn, repeat=3):
+    """Лучшее время из repeat запусков fn, в секундах"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def make_cycle(grid_width, grid_height, seed=0):
+    random.seed(seed)
+    return HamiltonianCycle(grid_width // 2, grid_height // 2)
+
+def bench_cycle_generation(quick):
+    """Время построения HamiltonianCycle для разных размеров поля"""
+    sizes = [(24, 16), (64, 36)] if quick else [(24, 16), (64, 36), (160, 90), (320, 180), (1000, 1000)]
+    results = []
+    for w, h in sizes:
+        seconds = best_time(lambda: make_cycle(w, h), repeat=1 if w * h > 10000 else 3)
+        results.append(metric(f"cycle_generation_{w}x{h}", seconds, "s"))
+    return results
+
+def bench_spanning_tree(quick):
+    """Остовное дерево базовой сетки каждой стратегией, время на узел.
+
+    Для O(N) время на узел не растет с размером: spanning_tree_*_growth - во
+    сколько раз оно на самом большом поле больше, чем на самом маленьком.
+    """
+    sizes = [(24, 16), (160, 90)] if quick else [(24, 16), (160, 90), (640, 360)]
+    results = []
+    for strategy, build in SPANNING_TREES.items():
+        name = strategy.replace("-", "_")
+        per_node = []
+        for w, h in sizes:
+            hamilton = make_cycle(w, h)
+            neighbors = hamilton.base_neighbors()
+            rng = random.Random(0)
+            seconds = best_time(lambda: build(neighbors, rng), repeat=3)
+            per_node.append(seconds / len(neighbors) * 1e6)
+            results.append(metric(f"spanning_tree_{name}_{w}x{h}", per_node[-1], "us"))
+        results.append(metric(f"spanning_tree_{name}_growth", per_node[-1] / per_node[0], "x"))
+    return results
+
+def bench_cycle_flip(quick):
+    """Замена ребра остовного дерева (mutation.CycleMutator) против нового цикла"""
+    from mutation import CycleMutator
+    sizes = [(24, 16), (160, 90)] if quick else [(24, 16), (160, 90), (320, 180)]
+    results = []
+    for w, h in sizes:
+        mutator = CycleMutator(make_cycle(w, h))
+        rng = random.Random(1)
+        flips = 200 if quick else 2000
+        start = time.perf_counter()
+        done = 0
+        while done < flips:
+            flip = mutator.propose(rng)
+            if flip is not None:
+                mutator.apply(flip)
+                done += 1
+        seconds = time.perf_counter() - start
+        results.append(metric(f"cycle_flip_{w}x{h}", seconds / flips * 1e6, "us"))
+    return results
+
+def bench_ai_decisions(quick):
+    """Сколько решений в секунду принимает ИИ срезок (get_next_position)"""
+    results = []
+    for w, h in [(24, 16), (160, 90)]:
+        game = SnakeSimulator(make_cycle(w, h), seed=1)
+        # Отыгрываем часть игры, чтобы змейка была не из трех клеток
+        for _ in range(w * h):
+            game.step()
+        head = game.snake[0]
+        calls = 20000 if quick else 200000
+        seconds = best_time(lambda: [game.get_next_position(head) for _ in range(calls)], repeat=3)
+        results.append(metric(f"ai_decisions_per_second_{w}x{h}", calls / seconds, "1/s", "higher"))
+    return results
+
+def bench_apple_spawn(quick):
+    """Стоимость появления яблока при разной заполненности поля"""
+    w, h = 160, 90
+    rng = random.Random(0)
+    results = []
+    for fill in (0.1, 0.5, 0.9, 0.99):
+        board = SnakeBoard(w, h)
+        cells = [(x, y) for x in range(w) for y in range(h)]
+        rng.shuffle(cells)
+        board.reset(cells[:int(len(cells) * fill)])
+        calls = 10000 if quick else 100000
+        seconds = best_time(lambda: [board.random_free(rng) for _ in range(calls)], repeat=3)
+        results.append(metric(f"apple_spawn_{int(fill * 100)}pct", seconds / calls * 1e6, "us"))
+    return results
+
+def bench_render(quick):
+    """Время кадра и число перерисованных пикселей: полная отрисовка и DirtyRenderer"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    try:
+        import pygame as pg
+        from renderer import compute_layout, draw_game, DirtyRenderer
+    except ImportError as e:
+        print(f"Пропускаем замер отрисовки: {e}")
+        return []
+
+    pg.init()
+    screen_size = (1920, 1080)
+    screen = pg.display.set_mode(screen_size)
+    results = []
+    for w, h in [(24, 16), (160, 90)]:
+        game = SnakeSimulator(make_cycle(w, h), seed=1)
+        layout = compute_layout(screen_size[0], screen_size[1], w, h)
+        # Длинная змейка нагружает отрисовку сильнее всего
+        while len(game.snake) < w * h // 2 and not game.completed:
+            game.step()
+        frames = 20 if quick else 200
+        seconds = best_time(lambda: [draw_game(screen, game, layout) for _ in range(frames)], repeat=3)
+        results.append(metric(f"render_frame_{w}x{h}", seconds / frames * 1000, "ms"))
+        results.append(metric(f"render_pixels_{w}x{h}", screen_size[0] * screen_size[1], "px"))
+
+        # Инкрементальная отрисовка: один ход змейки на кадр, как в скринсейвере
+        renderer = DirtyRenderer(screen, layout)
+        renderer.draw(game)
+        pixels = 0
+        start = time.perf_counter()
+        for _ in range(frames):
+            game.step()
+            renderer.draw(game)
+            pixels += renderer.pixels_touched
+        seconds = time.perf_counter() - start
+        results.append(metric(f"render_frame_dirty_{w}x{h}", seconds / frames * 1000, "ms"))
+        results.append(metric(f"render_pixels_dirty_{w}x{h}", pixels / frames, "px"))
+    pg.quit()
+    return results
+
+def bench_render_framebuffer(quick):
+    """Время кадра от размера поля на экране 4K: DirtyRenderer и FramebufferRenderer (numpy)"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    try:
+        import pygame as pg
+        import numpy  # noqa: F401
+        from renderer import compute_layout, DirtyRenderer, FramebufferRenderer
+    except ImportError as e:
+        print(f"Пропускаем замер numpy-отрисовки: {e}")
+        return []
+
+    pg.init()
+    screen_size = (3840, 2160)
+    screen = pg.display.set_mode(screen_size)
+    results = []
+    grids = [(24, 16), (160, 90)] if quick else [(24, 16), (160, 90), (300, 170)]
+    renderers = [("dirty", DirtyRenderer), ("numpy", FramebufferRenderer)]
+    frames = 20 if quick else 100
+    for w, h in grids:
+        hamilton = make_cycle(w, h)
+        layout = compute_layout(screen_size[0], screen_size[1], w, h)
+
+        # Один ход змейки на кадр, как в скринсейвере
+        game = SnakeSimulator(hamilton, seed=1)
+        for _ in range(frames):
+            game.step()
+        for name, renderer_class in renderers:
+            renderer = renderer_class(screen, layout)
+            renderer.draw(game)
+            start = time.perf_counter()
+            for _ in range(frames):
+                game.step()
+                renderer.draw(game)
+            seconds = time.perf_counter() - start
+            results.append(metric(f"render_step_{name}_{w}x{h}", seconds / frames * 1000, "ms"))
+
+        # Кадр целиком (первый после показа окна) со змейкой на половину поля:
+        # дорасти до неё ходами слишком долго, тело кладется прямо вдоль цикла
+        index = hamilton.index
+        game = SnakeSimulator(hamilton, seed=1)
+        game.snake.reset([index.cell(i) for i in range(w * h // 2, 0, -1)])
+        for name, renderer_class in renderers:
+            renderer = renderer_class(screen, layout)
+            def full_frames():
+                for _ in range(frames):
+                    renderer.invalidate()
+                    renderer.draw(game)
+            seconds = best_time(full_frames, repeat=3)
+            results.append(metric(f"render_full_{name}_{w}x{h}", seconds / frames * 1000, "ms"))
+    pg.quit()
+    return results
+
+def bench_snapshot(quick):
+    """Пробные ходы через SnakeSimulator.fork(): снимок с откатом и цена одного хода.
+
+    Снимок не копирует поле, поэтому обе цены не должны расти с размером поля.
+    """
+    results = []
+    rollout = 32
+    for w, h in [(24, 16), (160, 90)]:
+        game = SnakeSimulator(make_cycle(w, h), seed=1)
+        while len(game.snake) < min(w * h // 2, 1000) and not game.completed:
+            game.step()
+        calls = 2000 if quick else 20000
+
+        def snapshots():
+            for _ in range(calls):
+                snapshot = game.snapshot()
+                game.restore(snapshot)
+                game.release(snapshot)
+        seconds = best_time(snapshots)
+        results.append(metric(f"snapshot_restore_{w}x{h}", seconds / calls * 1e6, "us"))
+
+        def rollouts():
+            for _ in range(calls // 10):
+                with game.fork():
+                    for _ in range(rollout):
+                        game.step()
+        seconds = best_time(rollouts)
+        results.append(metric(f"rollout_move_{w}x{h}", seconds / (calls // 10) / rollout * 1e6, "us"))
+    return results
+
+def bench_telemetry(quick):
+    """Ходов в секунду без телеметрии и с ней (запись в jsonl из фонового потока)"""
+    import tempfile
+    from telemetry import Telemetry, TelemetryWriter
+
+    results = []
+    hamilton = make_cycle(24, 16)
+    seeds = range(3 if quick else 12)
+    path = os.path.join(tempfile.mkdtemp(), "telemetry.jsonl")
+    for mode in ("off", "on"):
+        moves = 0
+
+        def games():
+            nonlocal moves
+            moves = 0
+            for seed in seeds:
+                game = SnakeSimulator(hamilton, seed=seed)
+                telemetry = None
+                if mode == "on":
+                    telemetry = Telemetry(TelemetryWriter(path))
+                    telemetry.attach(game)
+                game.run_until_complete()
+                moves += game.moves
+                if telemetry is not None:
+                    telemetry.close()
+        seconds = best_time(games)
+        results.append(metric(f"telemetry_{mode}_ticks_per_second", moves / seconds, "1/s", "higher"))
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+    return results
+
+def bench_completion(quick):
+    """Сколько ходов уходит на заполнение всего поля"""
+    results = []
+    seeds = range(5 if quick else 20)
+    for w, h in [(24, 16), (40, 30)]:
+        hamilton = make_cycle(w, h)
+        runs = [(planner, False) for planner in PLANNERS] + [(planner, True) for planner in REPAIR_PLANNERS]
+        for planner, repair in runs:
+            # У жадной стратегии имена метрик прежние, чтобы база оставалась сравнимой
+            suffix = f"{w}x{h}" if planner == "greedy" else f"{planner}_{w}x{h}"
+            if repair:
+                suffix = f"repair_{suffix}"
+            moves = []
+            failures = 0
+            start = time.perf_counter()
+            for seed in seeds:
+                game = SnakeSimulator(hamilton, seed=seed, planner=planner, repair=repair)
+                result = game.run_until_complete()
+                if result is None:
+                    failures += 1
+                else:
+                    moves.append(result)
+            seconds = time.perf_counter() - start
+            if moves:
+                results.append(metric(f"moves_to_fill_{suffix}", sum(moves) / len(moves), "moves"))
+            results.append(metric(f"failures_{suffix}", failures, "games"))
+            results.append(metric(f"ticks_per_second_{suffix}", sum(moves) / seconds, "1/s", "higher"))
+    return results
+
+def bench_main_loop(quick):
+    """Кадр главного цикла main.py на HeadlessBackend: пока окно скрыто и пока идет игра"""
+    try:
+        import main as screensaver
+        from backends import HeadlessBackend
+    except ImportError as e:
+        print(f"Пропускаем замер главного цикла: {e}")
+        return []
+
+    stamps = []
+
+    class TimedBackend(HeadlessBackend):
+        def wait_frame(self, clock, fps):
+            stamps.append((self.visible, time.perf_counter()))
+            super().wait_frame(clock, fps)
+
+    # На пустом cycle_cache/ поддельные часы пробегают max_frames раньше, чем
+    # CyclePool построит цикл, и скринсейвер не включается. Цикл готовим заранее
+    settings = screensaver.load_settings()
+    screensaver.hamilton = screensaver.load_or_generate_cycle(settings["width"], settings["height"])
+
+    fps = 60
+    active_frames = 120 if quick else 1200
+    screensaver.main(TimedBackend(), max_frames=(screensaver.INACTIVITY_START_SCREENSAVER + 1) * fps + active_frames)
+    durations = {True: [], False: []}
+    for (visible, start), (_, end) in zip(stamps, stamps[1:]):
+        durations[visible].append(end - start)
+    results = []
+    for visible, name in [(False, "hidden"), (True, "active")]:
+        frames = durations[visible]
+        if not frames:
+            raise RuntimeError(f"Главный цикл не дал ни одного кадра в состоянии {name}")
+        results.append(metric(f"main_loop_frame_{name}", sum(frames) / len(frames) * 1000, "ms"))
+    return results
+
+def bench_dormant(quick):
+    """Процессорное время спящего режима и опоздание пробуждения, на настоящих часах"""
+    try:
+        import main as screensaver
+        from backends import HeadlessBackend, RealClock
+    except ImportError as e:
+        print(f"Пропускаем замер спящего режима: {e}")
+        return []
+
+    marks = {}
+
+    class DormantBackend(HeadlessBackend):
+        def sleep(self, seconds):
+            marks.setdefault("dormant", (time.perf_counter(), time.process_time()))
+            super().sleep(seconds)
+
+        def wait_frame(self, clock, fps):
+            # Первый кадр после сна - генерация началась, замер окончен
+            marks["awake"] = (time.perf_counter(), time.process_time())
+            screensaver.running = False
+
+    screensaver.main(DormantBackend(RealClock()))
+    (wall_start, cpu_start), (wall_end, cpu_end) = marks["dormant"], marks["awake"]
+    latency = screensaver.wake_latency.values()[-1]
+    return [
+        metric("dormant_cpu_percent", (cpu_end - cpu_start) / (wall_end - wall_start) * 100, "%"),
+        metric("dormant_wake_latency", latency * 1000, "ms"),
+    ]
+
+# Дочерний процесс для замера холодного старта: печатает метку на первой
+# итерации главного цикла, когда окно уже создано и спрятано
+FIRST_FRAME_SCRIPT = """
+import main
+from backends import HeadlessBackend, RealClock
+
+class FirstFrame(HeadlessBackend):
+    def sleep(self, seconds):
+        print("first frame", flush=True)
+        main.running = False
+
+main.main(FirstFrame(RealClock()))
+"""
+
+def bench_startup(quick):
+    """Импорт main.py (по -X importtime) и время от запуска процесса до первого кадра"""
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    repeat = 3 if quick else 10
+    import_times = []
+    first_frame = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                              cwd=here, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"Пропускаем замер старта: {proc.stderr.strip().splitlines()[-1]}")
+            return []
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == "main":
+                import_times.append(int(fields[1]) / 1000)
+
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", FIRST_FRAME_SCRIPT], cwd=here,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1"))
+        for line in proc.stdout:
+            if line.startswith("first frame"):
+                first_frame.append((time.perf_counter() - start) * 1000)
+                break
+        proc.wait()
+    results = [metric("import_main", min(import_times), "ms")]
+    if first_frame:
+        results.append(metric("time_to_first_frame", min(first_frame), "ms"))
+    return results
+
+BENCHMARKS = [
+    bench_cycle_generation,
+    bench_spanning_tree,
+    bench_cycle_flip,
+    bench_ai_decisions,
+    bench_apple_spawn,
+    bench_render,
+    bench_render_framebuffer,
+    bench_snapshot,
+    bench_telemetry,
+    bench_completion,
+    bench_main_loop,
+    bench_dormant,
+    bench_startup,
+]
+
+def compare(results, baseline, threshold):
+    """Метрики, ставшие хуже базы больше чем на threshold"""
+    base = {m["name"]: m for m in baseline.get("metrics", [])}
+    regressions = []
+    for m in results:
+        old = base.get(m["name"])
+        if old is None:
+            continue
+        change = m["value"] - old["value"]
+        if m["better"] == "higher":
+            change = -change
+        if old["value"] == 0:
+            # Например, число проигранных игр: любой рост с нуля - регрессия
+            change = float("inf") if change > 0 else 0.0
+        else:
+            change /= abs(old["value"])
+        if change > threshold:
+            regressions.append((m, old, change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности змейки")
+    parser.add_argument("--quick", action="store_true", help="короткий прогон")
+    parser.add_argument("--only", help="запустить только замеры, в имени которых есть эта строка")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое ухудшение, доля (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты как базу")
+    args = parser.parse_args()
+
+    results = []
+    for bench in BENCHMARKS:
+        if args.only and args.only not in bench.__name__:
+            continue
+        print(f"{bench.__name__}...")
+        for m in bench(args.quick):
+            print(f"  {m['name']}: {m['value']:.6g} {m['unit']}")
+            results.append(m)
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "metrics": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"База сохранена в {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Нет базы {args.baseline}, сравнение пропущено")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for m, old, change in regressions:
+        print(f"РЕГРЕССИЯ {m['name']}: {old['value']:.6g} -> {m['value']:.6g} {m['unit']} ({change:+.0%})")
+    if regressions:
+        return 1
+    print("Регрессий нет")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
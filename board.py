@@ -0,0 +1,139 @@
+# board.py
+import random
+from collections import deque
+from array import array
+
+# Записи журнала отмены
+PUSH, POP, RESET, CALL = range(4)
+
+class SnakeBoard:
+    """Тело змейки, карта занятости и множество свободных клеток.
+
+    Клетка (x, y) хранится как индекс y + height * x, так же как в hamiltonial.
+
+    Пока включен журнал (begin()), каждое изменение записывается в log, и
+    rollback() возвращает поле к отметке за время, пропорциональное числу
+    изменений после неё, а не размеру поля.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.body = deque()  # голова слева, хвост справа
+        self.occupied = bytearray(width * height)
+        # Индексированное множество свободных клеток: free[free_slot[cell]] == cell
+        self.free = list(range(width * height))
+        self.free_slot = array("i", range(width * height))
+        # Журнал отмены: (PUSH, pos, slot), (POP, pos), (RESET, старые структуры) или (CALL, undo)
+        self.log = None
+
+    def reset(self, cells):
+        """Ставит змейку на поле заново, cells - от головы к хвосту"""
+        size = self.width * self.height
+        log = self.log
+        if log is not None:
+            # Старые структуры не меняются, достаточно запомнить ссылки на них
+            log.append((RESET, self.body, self.occupied, self.free, self.free_slot))
+            self.log = None
+        self.body = deque()
+        self.occupied = bytearray(size)
+        self.free = list(range(size))
+        self.free_slot = array("i", range(size))
+        for pos in reversed(cells):
+            self.push_head(pos)
+        self.log = log
+
+    def push_head(self, pos):
+        """Добавляет новую голову, клетка должна быть свободной"""
+        cell = pos[1] + self.height * pos[0]
+        self.body.appendleft(pos)
+        self.occupied[cell] = 1
+
+        # Удаляем клетку из множества свободных: на её место ставим последнюю
+        slot = self.free_slot[cell]
+        if self.log is not None:
+            self.log.append((PUSH, pos, slot))
+        last = self.free.pop()
+        if last != cell:
+            self.free[slot] = last
+            self.free_slot[last] = slot
+        self.free_slot[cell] = -1
+
+    def pop_tail(self):
+        """Убирает хвост и возвращает его клетку"""
+        pos = self.body.pop()
+        cell = pos[1] + self.height * pos[0]
+        self.occupied[cell] = 0
+        self.free_slot[cell] = len(self.free)
+        self.free.append(cell)
+        if self.log is not None:
+            self.log.append((POP, pos))
+        return pos
+
+    def begin(self):
+        """Включает журнал отмены, если он выключен, и возвращает отметку для rollback()"""
+        if self.log is None:
+            self.log = []
+        return len(self.log)
+
+    def rollback(self, mark):
+        """Отменяет все изменения после отметки, порядок свободных клеток тоже восстанавливается"""
+        log = self.log
+        while len(log) > mark:
+            entry = log.pop()
+            kind, pos = entry[0], entry[1]
+            if kind == RESET:
+                self.body, self.occupied, self.free, self.free_slot = entry[1:]
+                continue
+            if kind == CALL:
+                entry[1]()
+                continue
+            cell = pos[1] + self.height * pos[0]
+            if kind == PUSH:
+                # Обратный порядок push_head: клетка возвращается на свой слот,
+                # последняя свободная - в конец списка
+                slot = entry[2]
+                self.body.popleft()
+                self.occupied[cell] = 0
+                self.free.append(cell)
+                last = self.free[slot]
+                self.free[slot] = cell
+                self.free[-1] = last
+                self.free_slot[last] = len(self.free) - 1
+                self.free_slot[cell] = slot
+            else:
+                self.body.append(pos)
+                self.occupied[cell] = 1
+                self.free.pop()
+                self.free_slot[cell] = -1
+
+    def note(self, undo):
+        """Добавляет в журнал функцию, которую rollback() вызовет, отменяя это место"""
+        if self.log is not None:
+            self.log.append((CALL, undo))
+
+    def end(self):
+        """Выключает журнал, отменить сделанное больше нельзя"""
+        self.log = None
+
+    def random_free(self, rng=random):
+        """Случайная свободная клетка за O(1), None если поле заполнено"""
+        if not self.free:
+            return None
+        return divmod(self.free[rng.randrange(len(self.free))], self.height)
+
+    def __len__(self):
+        return len(self.body)
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def __getitem__(self, i):
+        return self.body[i]
+
+    def __contains__(self, pos):
+        """Занята ли клетка телом змейки"""
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.occupied[y + self.height * x] == 1
+        return False
@@ -0,0 +1,118 @@
+# config.py
+"""Настройки скринсейвера из settings.txt.
+
+Файл разбирается один раз и перечитывается, только когда меняются время его
+изменения или размер: get() проверяет это при каждом вызове, poll() для
+главного цикла - не чаще раза в check_interval секунд. Ошибки разбора и
+проверки не прячутся: каждая печатается и остается в errors, а у ключа с
+ошибкой остается прежнее значение (при первом чтении - значение по умолчанию).
+"""
+import os
+
+SETTINGS_FILE = "settings.txt"
+DEFAULTS = {
+    "width": 24,  # четное число ячеек по горизонтали
+    "height": 16,  # четное число ячеек по вертикали
+    "delay": 80,  # задержка между тиками змейки
+}
+# Меньше не бывает: базовая сетка цикла - клетки 2x2, и стартовой змейке из трех
+# клеток в центре нужно поле хотя бы 4x4
+MIN_GRID_SIZE = 4
+# Как часто главный цикл смотрит на время изменения файла, в секундах
+CHECK_INTERVAL = 1.0
+
+def validate(key, value):
+    """Описание ошибки в значении ключа или None, если значение годится"""
+    if key in ("width", "height"):
+        if value < MIN_GRID_SIZE or value % 2:
+            return f"{key} должно быть четным и не меньше {MIN_GRID_SIZE}, а не {value}"
+    elif key == "delay" and value <= 0:
+        return f"delay должно быть больше нуля, а не {value}"
+    return None
+
+def parse_settings(lines, previous=None):
+    """Разбирает строки вида ключ=значение. Возвращает (настройки, список ошибок).
+
+    Ключ, которого нет в файле, получает значение по умолчанию, а ключ с
+    ошибкой - значение из previous.
+    """
+    previous = previous or DEFAULTS
+    settings = dict(DEFAULTS)
+    errors = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=" not in line:
+            errors.append(f"строка {number}: ожидается ключ=значение, а не {line!r}")
+            continue
+        key, value = (part.strip() for part in line.split("=", 1))
+        if key not in DEFAULTS:
+            errors.append(f"строка {number}: неизвестный ключ {key!r}, есть: {', '.join(DEFAULTS)}")
+            continue
+        try:
+            value = int(value)
+        except ValueError:
+            problem = f"{key} должно быть целым числом, а не {value!r}"
+        else:
+            problem = validate(key, value)
+        if problem:
+            errors.append(f"строка {number}: {problem}, остается {previous[key]}")
+            value = previous[key]
+        settings[key] = value
+    return settings, errors
+
+class Config:
+    def __init__(self, path=SETTINGS_FILE, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.settings = dict(DEFAULTS)
+        self.errors = []
+        # Сколько раз файл был разобран
+        self.loads = 0
+        self._signature = False
+        self._checked_at = None
+
+    def get(self):
+        """Копия текущих настроек, файл перечитывается, если изменился"""
+        self.reload_if_changed()
+        return dict(self.settings)
+
+    def poll(self, now):
+        """Для главного цикла: проверяет файл не чаще раза в check_interval секунд.
+
+        now - текущее время в секундах. Возвращает множество изменившихся ключей.
+        """
+        if self._checked_at is not None and 0 <= now - self._checked_at < self.check_interval:
+            return set()
+        self._checked_at = now
+        return self.reload_if_changed()
+
+    def reload_if_changed(self):
+        """Перечитывает файл, если он изменился. Возвращает множество изменившихся ключей"""
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return set()
+        self._signature = signature
+        return self._load(signature is not None)
+
+    def _load(self, exists):
+        old = self.settings
+        settings, errors = dict(DEFAULTS), []
+        if exists:
+            try:
+                with open(self.path, "r") as f:
+                    settings, errors = parse_settings(f, old)
+            except (OSError, UnicodeDecodeError) as e:
+                # Недочитанный файл не должен сбрасывать настройки
+                settings, errors = old, [f"не удалось прочитать файл: {e}"]
+        self.loads += 1
+        self.errors = errors
+        for error in errors:
+            print(f"Ошибка в {self.path}: {error}")
+        self.settings = settings
+        return {key for key in settings if settings[key] != old[key]}
@@ -0,0 +1,150 @@
+# cycle_cache.py
+"""Кэш гамильтоновых циклов на диске.
+
+Формат файла: заголовок HEADER (магия, версия, ширина, высота, seed), затем
+ширина*высота индексов клеток uint32 little-endian в порядке обхода цикла.
+Файл открывается через mmap, индексы читаются прямо из отображенной памяти.
+Ключ кэша - (ширина, высота, seed) полного поля. Размер каталога ограничен,
+при переполнении удаляются давно не использованные файлы (LRU по mtime).
+"""
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+from hamiltonial import HamiltonianCycle
+
+MAGIC = b"HCYC"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")
+
+DEFAULT_CACHE_DIR = "cycle_cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class CycleCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, width, height, seed):
+        return os.path.join(self.directory, f"cycle_{width}x{height}_{seed}.bin")
+
+    def seeds(self, width, height):
+        """Seed всех закэшированных циклов для поля width x height"""
+        prefix = f"cycle_{width}x{height}_"
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        seeds = []
+        for name in names:
+            if name.startswith(prefix) and name.endswith(".bin"):
+                try:
+                    seeds.append(int(name[len(prefix):-4]))
+                except ValueError:
+                    pass
+        return sorted(seeds)
+
+    def load(self, width, height, seed):
+        """Цикл из кэша или None, если его нет или файл поврежден"""
+        path = self.path(width, height, seed)
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        cells = None
+        try:
+            magic, version, w, h, s = HEADER.unpack_from(mm)
+            size = width * height
+            if (magic != MAGIC or version != VERSION or (w, h, s) != (width, height, seed)
+                    or len(mm) != HEADER.size + size * 4):
+                raise ValueError("bad header")
+            cells = memoryview(mm)[HEADER.size:].cast("I")
+            if sys.byteorder != "little":
+                cells = array("I", cells)
+                cells.byteswap()
+            hamilton = HamiltonianCycle.from_cells(width // 2, height // 2, cells)
+        except (struct.error, ValueError) as e:
+            print(f"Поврежденный файл кэша {path}: {e}")
+            cells = None
+            try:
+                mm.close()
+            except BufferError:
+                pass
+            self._remove(path)
+            return None
+
+        # Отмечаем использование для LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return hamilton
+
+    def save(self, hamilton, seed):
+        """Записывает цикл в кэш и освобождает место, если каталог переполнен"""
+        width, height = hamilton.full_w, hamilton.full_h
+        path = self.path(width, height, seed)
+        os.makedirs(self.directory, exist_ok=True)
+
+        cells = array("I", hamilton.cycle_cells)
+        if sys.byteorder != "little":
+            cells.byteswap()
+        # Пишем во временный файл и подменяем, чтобы не оставить половину файла
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, width, height, seed))
+            f.write(cells.tobytes())
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+
+    def get_or_create(self, width, height, seed):
+        """Цикл для (width, height, seed): из кэша, а при промахе строится и сохраняется"""
+        hamilton = self.load(width, height, seed)
+        if hamilton is None:
+            hamilton = HamiltonianCycle(width // 2, height // 2, rng=random.Random(seed))
+            try:
+                self.save(hamilton, seed)
+            except OSError as e:
+                print(f"Не удалось сохранить цикл в кэш: {e}")
+        return hamilton
+
+    def evict(self, keep=None):
+        """Удаляет самые старые файлы, пока кэш больше max_bytes"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(".bin"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path, st.st_size))
+            total += st.st_size
+
+        entries.sort()
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            if self._remove(path):
+                total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            # Например, файл еще открыт через mmap в Windows
+            return False
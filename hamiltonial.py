@@ -1,268 +1,366 @@
 # hamiltonian.py
-import math
+import gc
 import random
+from array import array
 
 class HNode:
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.edges = []
-        self.spanning_tree_adjacent = []
         self.cycle_no = -1
 
-    def set_edges(self, all_nodes):
-        self.edges = [
-            n for n in all_nodes 
-            if math.dist((self.x, self.y), (n.x, n.y)) == 1
-        ]
-
-    def set_spanning_tree_edges(self, spanning_tree):
-        self.spanning_tree_adjacent = []
-        for edge in spanning_tree:
-            if edge.contains(self):
-                other = edge.get_other_node(self)
-                if other not in self.spanning_tree_adjacent:
-                    self.spanning_tree_adjacent.append(other)
-    
     def get_direction_to(self, other):
         return (other.x - self.x, other.y - self.y)
 
-class HEdge:
-    def __init__(self, node1, node2):
-        self.node1 = node1
-        self.node2 = node2
+# Spanning tree strategies. Each takes the neighbour lists of the base grid
+# nodes and an rng, and returns the tree as (parent, child) node index pairs
+# in the order the nodes joined the tree. Membership is a bytearray, so every
+# step is O(1).
 
-    def is_equal_to(self, other):
-        return (self.node1 == other.node1 and self.node2 == other.node2) or \
-               (self.node1 == other.node2 and self.node2 == other.node1)
+def frontier_tree(neighbors, rng):
+    """Grow the tree from a random tree node that still has free neighbours.
 
-    def contains(self, node):
-        return node == self.node1 or node == self.node2
+    Same distribution as drawing any tree node and retrying when it is boxed
+    in, but boxed-in nodes leave the active list for good, so the expected
+    time is O(N). Indices are drawn as int(random() * n): one C call instead
+    of randrange, with a bias of about n / 2**53.
+    """
+    size = len(neighbors)
+    rand = rng.random
+    visited = bytearray(size)
+    start = int(rand() * size)
+    visited[start] = 1
+    active = [start]
+    grow = active.append
+    edges = []
+    append = edges.append
+    remaining = size - 1
+    while remaining:
+        slot = int(rand() * len(active))
+        node = active[slot]
+        free = [n for n in neighbors[node] if not visited[n]]
+        if not free:
+            # Swap-remove: the node can never grow the tree again
+            active[slot] = active[-1]
+            active.pop()
+            continue
+        other = free[int(rand() * len(free))]
+        visited[other] = 1
+        grow(other)
+        append((node, other))
+        remaining -= 1
+    return edges
 
-    def get_other_node(self, node):
-        return self.node2 if node == self.node1 else self.node1
+def prim_tree(neighbors, rng):
+    """Randomized Prim: a uniformly random edge from the tree to a free node. O(N)"""
+    size = len(neighbors)
+    visited = bytearray(size)
+    start = rng.randrange(size)
+    visited[start] = 1
+    frontier = [(start, n) for n in neighbors[start]]
+    edges = []
+    while frontier and len(edges) < size - 1:
+        slot = rng.randrange(len(frontier))
+        node, other = frontier[slot]
+        frontier[slot] = frontier[-1]
+        frontier.pop()
+        if visited[other]:
+            continue
+        visited[other] = 1
+        edges.append((node, other))
+        frontier.extend((other, n) for n in neighbors[other] if not visited[n])
+    return edges
 
-    def connect_nodes(self):
-        if self.node2 not in self.node1.spanning_tree_adjacent:
-            self.node1.spanning_tree_adjacent.append(self.node2)
-        if self.node1 not in self.node2.spanning_tree_adjacent:
-            self.node2.spanning_tree_adjacent.append(self.node1)
+def wilson_tree(neighbors, rng):
+    """Wilson's algorithm: loop-erased random walks, a uniform spanning tree.
+
+    Expected time is the mean hitting time of the grid, about O(N log N).
+    """
+    size = len(neighbors)
+    in_tree = bytearray(size)
+    in_tree[rng.randrange(size)] = 1
+    # Last exit from every node of the current walk; overwriting it erases loops
+    step = [-1] * size
+    edges = []
+    for start in range(size):
+        node = start
+        while not in_tree[node]:
+            step[node] = rng.choice(neighbors[node])
+            node = step[node]
+        node = start
+        while not in_tree[node]:
+            in_tree[node] = 1
+            edges.append((step[node], node))
+            node = step[node]
+    return edges
+
+def aldous_broder_tree(neighbors, rng):
+    """Aldous-Broder: one random walk, every first visit adds an edge.
+
+    Uniform like Wilson's, but takes the cover time of the grid, O(N log^2 N).
+    """
+    size = len(neighbors)
+    visited = bytearray(size)
+    node = rng.randrange(size)
+    visited[node] = 1
+    edges = []
+    while len(edges) < size - 1:
+        other = rng.choice(neighbors[node])
+        if not visited[other]:
+            visited[other] = 1
+            edges.append((node, other))
+        node = other
+    return edges
+
+SPANNING_TREES = {
+    "frontier": frontier_tree,
+    "prim": prim_tree,
+    "wilson": wilson_tree,
+    "aldous-broder": aldous_broder_tree,
+}
 
 class HamiltonianCycle:
-    def __init__(self, base_w, base_h):
+    def __init__(self, base_w, base_h, rng=None, tree_strategy="frontier"):
+        # rng - random.Random for reproducible cycles, the global random module by default.
+        # tree_strategy - key of SPANNING_TREES, how the base grid spanning tree is grown
+        if tree_strategy not in SPANNING_TREES:
+            raise ValueError(f"Unknown spanning tree strategy {tree_strategy}, "
+                             f"choose from: {', '.join(SPANNING_TREES)}")
+        self.rng = rng if rng is not None else random
+        self.tree_strategy = tree_strategy
         self.base_w = base_w
         self.base_h = base_h
         self.full_w = base_w * 2
         self.full_h = base_h * 2
-        self.cycle = []
+        self.cycle_cells = []
+        self._cycle = None
+        self._index = None
         self.spanning_tree = []
         self.create_cycle()
 
+    @property
+    def cycle(self):
+        """Cycle as a list of HNode, created on first access"""
+        if self._cycle is None:
+            full_h = self.full_h
+            self._cycle = [HNode(i // full_h, i % full_h) for i in self.cycle_cells]
+            for i, node in enumerate(self._cycle):
+                node.cycle_no = i
+        return self._cycle
+
     def create_cycle(self):
-        # Create spanning tree for the base grid
-        self.create_spanning_tree()
-        
-        # Create nodes for the full-size grid
-        cycle_nodes = []
-        for i in range(self.full_w):
-            for j in range(self.full_h):
-                cycle_nodes.append(HNode(i, j))
-        
-        # Set edges between neighboring nodes
-        for n in cycle_nodes:
-            n.set_edges(cycle_nodes)
-        
-        # Connect nodes based on the spanning tree connections
-        for st_node in self.spanning_tree_nodes:
-            for other in st_node.spanning_tree_adjacent:
-                direction = st_node.get_direction_to(other)
-                x = st_node.x * 2
-                y = st_node.y * 2
-                
-                # Create the corresponding connections in the full grid
-                if direction[0] == 1:  # Node is to the right
-                    self.connect_pair(x + 1, y, x + 2, y, cycle_nodes)
-                    self.connect_pair(x + 1, y + 1, x + 2, y + 1, cycle_nodes)
-                elif direction[1] == 1:  # Node is below
-                    self.connect_pair(x, y + 1, x, y + 2, cycle_nodes)
-                    self.connect_pair(x + 1, y + 1, x + 1, y + 2, cycle_nodes)
-        
-        # Find nodes with only one connection and connect them
-        self.fix_degree_one_nodes(cycle_nodes)
-        
-        # Build the cycle
-        self.build_cycle(cycle_nodes)
-        
-        # Assign cycle numbers
-        for i, node in enumerate(self.cycle):
-            node.cycle_no = i
-
-    def connect_pair(self, x1, y1, x2, y2, nodes):
-        """Connect two nodes in the full grid by their coordinates"""
-        if (0 <= x1 < self.full_w and 0 <= y1 < self.full_h and 
-            0 <= x2 < self.full_w and 0 <= y2 < self.full_h):
-            idx1 = y1 + self.full_h * x1
-            idx2 = y2 + self.full_h * x2
-            if idx1 < len(nodes) and idx2 < len(nodes):
-                a = nodes[idx1]
-                b = nodes[idx2]
-                if b not in a.spanning_tree_adjacent:
-                    a.spanning_tree_adjacent.append(b)
-                if a not in b.spanning_tree_adjacent:
-                    b.spanning_tree_adjacent.append(a)
-
-    def fix_degree_one_nodes(self, cycle_nodes):
-        """Connect nodes that have only one connection"""
-        # First round of fixing - based on direction
-        degree1_nodes = [n for n in cycle_nodes if len(n.spanning_tree_adjacent) == 1]
-        new_edges = []
-        
-        for node in degree1_nodes:
-            if not node.spanning_tree_adjacent:
-                continue
-                
-            # Get direction from the connected node to this node
-            other = node.spanning_tree_adjacent[0]
-            dx, dy = node.x - other.x, node.y - other.y
+        # The neighbour lists and tree edges are hundreds of thousands of small
+        # containers without reference cycles. Collecting while they are built
+        # only rescans them, about a third of the time on large grids
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            # Create spanning tree for the base grid
+            self.create_spanning_tree()
             
-            # Extend in the same direction to find another node
-            target_x, target_y = node.x + dx, node.y + dy
+            # Every cell has exactly one successor on the walk around the tree
+            successor = self.link_cells()
             
-            if (0 <= target_x < self.full_w and 0 <= target_y < self.full_h):
-                # Calculate the index in the flat list
-                target_idx = target_y + self.full_h * target_x
-                if target_idx < len(cycle_nodes):
-                    target = cycle_nodes[target_idx]
-                    edge = HEdge(node, target)
-                    # Check if the edge is already added
-                    unique_edge = True
-                    for e in new_edges:
-                        if e.is_equal_to(edge):
-                            unique_edge = False
-                            break
-                    if unique_edge:
-                        new_edges.append(edge)
-        
-        # Connect all new edges
-        for edge in new_edges:
-            edge.connect_nodes()
-        
-        # Second round of fixing - connect remaining degree1 nodes
-        degree1_nodes = [n for n in cycle_nodes if len(n.spanning_tree_adjacent) == 1]
-        new_edges = []
-        
-        for node in degree1_nodes:
-            # Find another degree1 node that's adjacent to this one and in the same cell
-            for other in degree1_nodes:
-                if node != other and math.dist((node.x, node.y), (other.x, other.y)) == 1:
-                    # Check if they're in the same 2x2 cell
-                    if (node.x // 2 == other.x // 2 and node.y // 2 == other.y // 2):
-                        edge = HEdge(node, other)
-                        # Check for uniqueness
-                        unique_edge = True
-                        for e in new_edges:
-                            if e.is_equal_to(edge):
-                                unique_edge = False
-                                break
-                        if unique_edge:
-                            new_edges.append(edge)
-                        break
-        
-        # Connect all new edges from second round
-        for edge in new_edges:
-            edge.connect_nodes()
-
-    def build_cycle(self, cycle_nodes):
-        """Build a cycle starting from a random node"""
-        # Find a node with at least one connection
-        start = next((n for n in cycle_nodes if n.spanning_tree_adjacent), None)
-        if not start:
-            raise ValueError("No valid start node found")
-        
-        self.cycle = [start]
+            # Build the cycle
+            self.build_cycle(successor)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._cycle = None
+        self._index = None
+
+    def link_cells(self):
+        """Successor of every full-grid cell on the walk around the spanning tree.
+
+        The full-size grid is flat: cell (x, y) has index y + full_h * x, and
+        base node i covers a 2x2 block of cells. The walk keeps the tree on its
+        left, so each cell of a block either turns to the next cell of the same
+        block or, where a tree edge leaves the block on that side, steps across
+        into the neighbouring block - two checks per block, no degree fixing.
+        """
+        base_w, base_h = self.base_w, self.base_h
+        full_h = self.full_h
         
-        if not start.spanning_tree_adjacent:
-            raise ValueError("Starting node has no connections")
-            
-        current = start.spanning_tree_adjacent[0]
-        previous = start
+        # Tree edges going right and down from each base node
+        right = bytearray(base_w * base_h)
+        down = bytearray(base_w * base_h)
+        for a, b in self.spanning_tree:
+            if a > b:
+                a, b = b, a
+            if b - a == base_h:
+                right[a] = 1
+            else:
+                down[a] = 1
         
-        # Keep traversing until we return to the start
-        while current != start:
-            # Add the current node to the cycle
-            self.cycle.append(current)
-            
-            # Find the next node to visit
-            next_node = None
-            for node in current.spanning_tree_adjacent:
-                if node != previous:
-                    next_node = node
-                    break
-            
-            if not next_node:
-                # If we can't find a next node that's not the previous one,
-                # that means we've reached a dead end (this shouldn't happen)
-                break
-            
-            previous = current
-            current = next_node
+        successor = [0] * (self.full_w * full_h)
+        for x in range(base_w):
+            column = x * base_h
+            top_left = 2 * full_h * x
+            for i in range(column, column + base_h):
+                top_right = top_left + full_h
+                # Top-left goes down unless the tree leaves to the left,
+                # top-right goes left unless it leaves upward, and so on around
+                successor[top_left] = top_left - full_h if x and right[i - base_h] else top_left + 1
+                successor[top_right] = top_right - 1 if i > column and down[i - 1] else top_left
+                successor[top_right + 1] = top_right + 1 + full_h if right[i] else top_right
+                successor[top_left + 1] = top_left + 2 if down[i] else top_right + 1
+                top_left += 2
+        return successor
+
+    def build_cycle(self, successor):
+        """Walk the successors from cell 0 until the walk returns to it"""
+        size = len(successor)
+        order = [0]
+        append = order.append
+        current = successor[0]
+        while current:
+            append(current)
+            current = successor[current]
         
         # Verify the cycle is complete
-        if len(self.cycle) != len(cycle_nodes):
-            missing = len(cycle_nodes) - len(self.cycle)
+        if len(order) != size:
+            missing = size - len(order)
             raise ValueError(f"Cycle incomplete! Missing {missing} nodes")
-
-    def create_spanning_tree(self):
-        """Create a random spanning tree for the base grid"""
-        # Create nodes for the base grid
-        st_nodes = []
-        for i in range(self.base_w):
-            for j in range(self.base_h):
-                st_nodes.append(HNode(i, j))
         
-        # Set edges between neighboring nodes
-        for n in st_nodes:
-            n.set_edges(st_nodes)
+        self.cycle_cells = order
+
+    @classmethod
+    def from_cells(cls, base_w, base_h, cycle_cells):
+        """Rebuild a HamiltonianCycle from a stored cycle order without generating it"""
+        self = cls.__new__(cls)
+        self.rng = random
+        self.tree_strategy = "frontier"
+        self.base_w = base_w
+        self.base_h = base_h
+        self.full_w = base_w * 2
+        self.full_h = base_h * 2
+        self._cycle = None
+        self._index = None
+        if len(cycle_cells) != self.full_w * self.full_h:
+            raise ValueError("Cycle does not cover the grid")
+        self.cycle_cells = cycle_cells
         
-        # Create a random spanning tree
+        # The cycle crosses between 2x2 blocks exactly along spanning tree edges,
+        # once in each direction, so every tree edge is taken on its forward crossing
+        full_h = self.full_h
         spanning_tree = []
+        prev_x, prev_y = divmod(cycle_cells[-1], full_h)
+        for cell in cycle_cells:
+            x, y = divmod(cell, full_h)
+            if abs(x - prev_x) + abs(y - prev_y) != 1:
+                raise ValueError("Cycle has a gap")
+            a = prev_y // 2 + base_h * (prev_x // 2)
+            b = y // 2 + base_h * (x // 2)
+            if a < b:
+                spanning_tree.append((a, b))
+            prev_x, prev_y = x, y
         
-        # Start with a random node
-        random_node = random.choice(st_nodes)
-        if not random_node.edges:
-            random_node = next(n for n in st_nodes if n.edges)
-            
-        # Connect it to a random neighbor
-        random_edge = random.choice(random_node.edges)
-        spanning_tree.append(HEdge(random_node, random_edge))
-        
-        # Track nodes that are part of the tree
-        nodes_in_tree = [random_node, random_edge]
-        
-        # Add edges until all nodes are in the tree
-        while len(nodes_in_tree) < len(st_nodes):
-            # Select a random node from the tree
-            current_node = random.choice(nodes_in_tree)
-            
-            # Find neighbors that aren't in the tree yet
-            available_edges = [n for n in current_node.edges if n not in nodes_in_tree]
-            
-            if available_edges:
-                # Connect to a random neighbor
-                next_node = random.choice(available_edges)
-                nodes_in_tree.append(next_node)
-                spanning_tree.append(HEdge(current_node, next_node))
-        
-        # Set spanning tree edges for all nodes
-        for n in st_nodes:
-            n.set_spanning_tree_edges(spanning_tree)
-        
+        if len(spanning_tree) != base_w * base_h - 1:
+            raise ValueError("Cycle is not built from a spanning tree")
         self.spanning_tree = spanning_tree
-        self.spanning_tree_nodes = st_nodes
+        return self
+
+    def base_neighbors(self):
+        """Neighbour index lists of the base grid nodes, node i is y + base_h * x.
+
+        Each list is ordered left, up, down, right.
+        """
+        w, h = self.base_w, self.base_h
+        neighbors = []
+        for x in range(w):
+            column = x * h
+            left = x > 0
+            right = x < w - 1
+            for i in range(column, column + h):
+                row = []
+                if left:
+                    row.append(i - h)
+                if i > column:
+                    row.append(i - 1)
+                if i < column + h - 1:
+                    row.append(i + 1)
+                if right:
+                    row.append(i + h)
+                neighbors.append(row)
+        return neighbors
+
+    def create_spanning_tree(self):
+        """Random spanning tree of the base grid as (parent, child) node index pairs,
+        grown with self.tree_strategy"""
+        self.spanning_tree = SPANNING_TREES[self.tree_strategy](self.base_neighbors(), self.rng)
+
+    @property
+    def index(self):
+        """CycleIndex for this cycle, built once on first access"""
+        if self._index is None:
+            self._index = CycleIndex(self.full_w, self.full_h, self.cycle_cells)
+        return self._index
 
     def get_next_position(self, x, y):
         """Get the next position in the cycle after (x,y)"""
-        for i, node in enumerate(self.cycle):
-            if node.x == x and node.y == y:
-                return self.cycle[(i + 1) % len(self.cycle)]
-        return None
\ No newline at end of file
+        i = self.index.position((x, y))
+        if i == -1:
+            return None
+        return self.cycle[(i + 1) % len(self.cycle_cells)]
+
+class CycleIndex:
+    """Array-backed lookups for a finished cycle.
+
+    Cells use the same flat numbering as HamiltonianCycle (y + height * x),
+    cycle positions run from 0 to length - 1 along the cycle order.
+    """
+
+    def __init__(self, width, height, cycle_cells):
+        self.width = width
+        self.height = height
+        self.length = len(cycle_cells)
+        
+        # Position -> cell and cell -> position
+        self.cell_at = array("i", cycle_cells)
+        pos_of = [-1] * (width * height)
+        for pos, cell in enumerate(cycle_cells):
+            pos_of[cell] = pos
+        self.pos_of = array("i", pos_of)
+        
+        # Cycle positions of the left/up/down/right neighbour of every cell
+        left = [-1] * height + pos_of[:-height]
+        right = pos_of[height:] + [-1] * height
+        up = [-1] + pos_of[:-1]
+        down = pos_of[1:] + [-1]
+        for x in range(width):
+            up[x * height] = -1
+            down[x * height + height - 1] = -1
+        
+        # Up to 4 neighbours of every cycle position, as cycle positions in
+        # ascending order (missing neighbours sort first as -1)
+        self.neighbors = array("i", [
+            p for cell in cycle_cells
+            for p in sorted((left[cell], up[cell], down[cell], right[cell]))
+        ])
+
+    def __len__(self):
+        return self.length
+
+    def position(self, pos):
+        """Cycle position of cell (x, y), or -1 if it is off the grid"""
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.pos_of[y + self.height * x]
+        return -1
+
+    def cell(self, i):
+        """Cell (x, y) at cycle position i"""
+        return divmod(self.cell_at[i], self.height)
+
+    def next_position(self, i):
+        """Cycle position that follows i"""
+        return (i + 1) % self.length
+
+    def distance(self, from_pos, to_pos):
+        """Number of steps forward along the cycle from from_pos to to_pos"""
+        return (to_pos - from_pos) % self.length
+
+    def neighbor_positions(self, i):
+        """Cycle positions of the grid neighbours of cycle position i"""
+        start = i * 4
+        return [p for p in self.neighbors[start:start + 4] if p != -1]
\ No newline at end of file
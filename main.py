@@ -1,97 +1,102 @@
 import sys
-import pygame as pg
-from pygame.locals import *
 import random
-import math
 import time
-import ctypes
 import os
 import threading
-from hamiltonial import HamiltonianCycle, HNode, HEdge
-from pystray import MenuItem as item
-import pystray
-from PIL import Image, ImageDraw
-
-# Если NOFRAME не определен в pygame, определим его сами
-try:
-    NOFRAME
-except NameError:
-    NOFRAME = 0x00000020  # Типичное значение для SDL_NOFRAME
-
-# Windows API для мониторинга активности и управления окнами
-user32 = ctypes.windll.user32
-kernel32 = ctypes.windll.kernel32
-
-# Константы
-SW_HIDE = 0
-SW_SHOW = 5
-SW_MINIMIZE = 6
-SW_MAXIMIZE = 3
-SW_RESTORE = 9
-SPI_GETSCREENSAVEACTIVE = 16
-SPI_SETSCREENSAVEACTIVE = 17
-WS_EX_TOOLWINDOW = 0x00000080
-GWL_EXSTYLE = -20
-GWL_STYLE = -16
-WS_POPUP = 0x80000000
+import signal
+from simulator import SnakeSimulator
+from config import Config, SETTINGS_FILE
+from tuning import TUNING_FILE, load_tuning, tuned_parameters
+from cycle_cache import CycleCache
+from pregen import CyclePool
+from replay import ReplayRecorder
+from profiler import Profiler, TimingRing
+from timestep import FixedTimestep, RateCounter, TURBO_FRAME_BUDGET, TURBO_RENDER_EVERY
+# pygame, renderer, backends, pystray и PIL импортируются там, где нужны:
+# `main.py --headless` обходится без них, а окно появляется раньше иконки в трее
 
 # Константы для скринсейвера
 INACTIVITY_START_GENERATING = 5 #90  # 1.5 минуты в секундах
 INACTIVITY_START_SCREENSAVER = 10 #120  # 2 минуты в секундах
+# Ввод, замеченный системой позже этого запаса, считается новой активностью
+IDLE_EPSILON = 0.05
+# Спящий режим (окно скрыто, цикл не готовится): не рисуем и спим до
+# INACTIVITY_START_GENERATING, просыпаясь не реже раза в столько секунд
+DORMANT_MAX_SLEEP = 1.0
+
+# Каждая игра пишется в файл, чтобы столкновение можно было воспроизвести
+REPLAY_DIR = "replays"
+REPLAY_KEEP = 20
+# Файл для гистограмм профилировщика (клавиша J или сигнал SIGUSR1)
+PROFILE_DUMP = "profile_%Y%m%d_%H%M%S.json"
+
+# С включенной перестройкой (клавиша M) цикл меняется на одно ребро раз в столько тиков
+MORPH_EVERY = 10
 
 # Глобальные переменные
-last_activity_time = time.time()
+# Платформенная часть (backends.py), выбирается в main()
+backend = None
+last_activity_time = 0
 screensaver_active = False
 generating_cycle = False
 hamilton = None
 running = True
 pygame_thread = None
 icon = None
-last_move_time = 0
-hamilton_path = []
-path_map = {}
-snake = []
-direction = (1, 0)
-add_count = 0
-apple = None
-head_cycle_position = 0
+cycle_cache = CycleCache()
+# Замеры фаз главного цикла, включаются клавишей H
+profiler = Profiler()
+cycle_pool = CyclePool(cycle_cache, profiler=profiler)
+profile_dump_requested = False
+# На сколько секунд позже INACTIVITY_START_GENERATING проснулся спящий режим
+wake_latency = TimingRing(64)
+cycle_index = None
+game = None
+auto_mode = True
+acceleration_mode = True
+planner = "greedy"
+# Перестройка цикла к каждому новому яблоку (клавиша R)
+repair_mode = False
+# Настройки из settings.txt, главный цикл перечитывает их при изменении файла
+config = Config(SETTINGS_FILE)
+# Счетчики и события решений ИИ (telemetry.Telemetry), включаются --telemetry
+telemetry = None
+# Таблица параметров ИИ по размерам поля из tuning.py, читается при первой игре
+tuning_table = None
 
 def load_settings():
-    """Загрузка настроек из файла settings.txt"""
-    default_settings = {
-        "width": 24,  # четное число ячеек по горизонтали
-        "height": 16,  # четное число ячеек по вертикали
-        "delay": 80   # задержка между тиками змейки
-    }
-    
-    settings = default_settings.copy()
-    
-    try:
-        if os.path.exists("settings.txt"):
-            with open("settings.txt", "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if "=" in line and not line.startswith("#"):
-                        key, value = line.split("=", 1)
-                        key = key.strip()
-                        value = value.strip()
-                        if key in settings:
-                            settings[key] = int(value)
-    except Exception as e:
-        print(f"Ошибка при чтении настроек: {e}")
-    
-    # Проверка валидности настроек
-    if settings["width"] % 2 != 0:
-        settings["width"] = (settings["width"] // 2) * 2
-    if settings["height"] % 2 != 0:
-        settings["height"] = (settings["height"] // 2) * 2
-    if settings["delay"] <= 0:
-        settings["delay"] = 80
-    
-    return settings
+    """Настройки из settings.txt. Файл разбирается заново, только если он изменился"""
+    return config.get()
+
+def load_tuned_parameters(grid_width, grid_height):
+    """min_distance и apple_growth для этого размера поля из tuning.json, если он там есть"""
+    global tuning_table
+    if tuning_table is None:
+        tuning_table = load_tuning(TUNING_FILE)
+    return tuned_parameters(tuning_table, grid_width, grid_height)
+
+def load_or_generate_cycle(grid_width, grid_height):
+    """Берет готовый цикл из кэша, а если для этого размера его нет - строит и кэширует новый"""
+    seeds = cycle_cache.seeds(grid_width, grid_height)
+    for seed in random.sample(seeds, len(seeds)):
+        hamilton = cycle_cache.load(grid_width, grid_height, seed)
+        if hamilton is not None:
+            return hamilton
+    return cycle_cache.get_or_create(grid_width, grid_height, random.getrandbits(32))
+
+def start_tray():
+    """Запускает иконку в трее в отдельном потоке"""
+    threading.Thread(target=create_tray_icon, daemon=True).start()
 
 def create_tray_icon():
     """Создаёт иконку в системном трее"""
+    try:
+        import pystray
+        from pystray import MenuItem as item
+        from PIL import Image, ImageDraw
+    except ImportError as e:
+        print(f"Иконки в трее не будет: {e}")
+        return
     # Создаем простую иконку
     image = Image.new('RGB', (64, 64), color = (0, 128, 0))
     d = ImageDraw.Draw(image)
@@ -114,19 +119,13 @@ def create_tray_icon():
     icon = pystray.Icon("snake_screensaver", image, "Snake Screensaver", menu)
     icon.run()
 
-def remove_from_taskbar(hwnd):
-    """Удаляет окно из таскбара"""
-    # Получение текущего стиля окна
-    style = user32.GetWindowLongA(hwnd, GWL_EXSTYLE)
-    # Добавление флага WS_EX_TOOLWINDOW
-    user32.SetWindowLongA(hwnd, GWL_EXSTYLE, style | WS_EX_TOOLWINDOW)
-
 def check_activity():
     """Проверяет активность пользователя"""
     global last_activity_time, screensaver_active, generating_cycle, hamilton
+    import pygame as pg
     
     # Получаем информацию о позиции мыши и нажатиях клавиш
-    current_time = time.time()
+    current_time = backend.time()
     
     # Проверка, есть ли активность
     mouse_info = pg.mouse.get_rel()
@@ -134,6 +133,11 @@ def check_activity():
     mouse_pressed = any(pg.mouse.get_pressed())
     
     activity_detected = mouse_info != (0, 0) or keys_pressed or mouse_pressed
+    # Скрытое окно не получает ввод, поэтому спрашиваем систему, когда
+    # пользователь в последний раз что-то трогал
+    idle = backend.idle_seconds()
+    if idle is not None and current_time - idle > last_activity_time + IDLE_EPSILON:
+        activity_detected = True
     
     if activity_detected:
         # Сбрасываем таймер при обнаружении активности
@@ -154,104 +158,163 @@ def check_activity():
     
     if not generating_cycle and not screensaver_active and inactivity_time >= INACTIVITY_START_GENERATING:
         generating_cycle = True
+        wake_latency.add(inactivity_time - INACTIVITY_START_GENERATING)
         
     # Проверяем, нужно ли активировать скринсейвер
     if generating_cycle and not screensaver_active and inactivity_time >= INACTIVITY_START_SCREENSAVER:
-        if hamilton and hamilton.cycle:
+        if hamilton and hamilton.cycle_cells:
             init_game()  # Инициализируем игру перед показом окна
             screensaver_active = True
             show_window()
             
     return False
 
+def dormant_timeout():
+    """Сколько можно спать, не опоздав к началу генерации цикла"""
+    inactivity_time = backend.time() - last_activity_time
+    return min(DORMANT_MAX_SLEEP, INACTIVITY_START_GENERATING - inactivity_time)
+
 def hide_window():
     """Скрывает окно программы"""
-    hwnd = pg.display.get_wm_info()["window"]
-    
-    # Полностью скрываем окно
-    user32.ShowWindow(hwnd, SW_HIDE)
-    
-    # Дополнительно перемещаем его за пределы экрана
-    user32.SetWindowPos(hwnd, 0, -32000, -32000, 0, 0, 0x0001)
-    
-    # Установим минимальный стиль окна, чтобы убрать заголовок и границы
-    style = user32.GetWindowLongA(hwnd, GWL_STYLE)
-    user32.SetWindowLongA(hwnd, GWL_STYLE, WS_POPUP)
+    backend.hide_window()
 
 def show_window():
     """Показывает и разворачивает окно программы"""
-    hwnd = pg.display.get_wm_info()["window"]
-    
-    # Восстанавливаем стиль окна, чтобы убрать декорации
-    user32.SetWindowLongA(hwnd, GWL_STYLE, WS_POPUP)
-    
-    # Сначала возвращаем окно на экран
-    user32.SetWindowPos(hwnd, 0, 0, 0, 0, 0, 0x0001)
-    
-    # Затем показываем и разворачиваем
-    user32.ShowWindow(hwnd, SW_MAXIMIZE)
-    user32.SetForegroundWindow(hwnd)
+    backend.show_window()
+
+def start_recording(settings):
+    """Начинает запись текущей игры в REPLAY_DIR, старые записи удаляются"""
+    try:
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        names = sorted(name for name in os.listdir(REPLAY_DIR) if name.endswith(".bin"))
+        for name in names[:max(0, len(names) - REPLAY_KEEP + 1)]:
+            os.remove(os.path.join(REPLAY_DIR, name))
+        name = time.strftime("replay_%Y%m%d_%H%M%S") + f"_{game.seed}.bin"
+        ReplayRecorder(os.path.join(REPLAY_DIR, name), game, settings)
+    except OSError as e:
+        print(f"Не удалось начать запись игры: {e}")
 
-def init_game():
-    """Инициализирует игру и гамильтонов цикл"""
-    global hamilton, hamilton_path, path_map, snake, direction, add_count, apple
+def request_profile_dump(signum=None, frame=None):
+    """Обработчик сигнала: только ставит флаг, файл пишется в главном цикле"""
+    global profile_dump_requested
+    profile_dump_requested = True
+
+def dump_profile():
+    global profile_dump_requested
+    profile_dump_requested = False
+    path = time.strftime(PROFILE_DUMP)
+    try:
+        profiler.dump(path)
+        print(f"Замеры сохранены в {path}")
+    except OSError as e:
+        print(f"Не удалось сохранить замеры: {e}")
+
+def init_game(fresh=None):
+    """Инициализирует игру и гамильтонов цикл. fresh - готовый цикл, по умолчанию
+    берется из фоновой очереди"""
+    global hamilton, cycle_index, game
     
     # Получаем настройки
     settings = load_settings()
     grid_width, grid_height = settings["width"], settings["height"]
     
-    # Инициализация гамильтонова цикла
+    # Инициализация гамильтонова цикла: свежий из фоновой очереди, если он готов
+    if fresh is None:
+        fresh = cycle_pool.get()
+    if fresh is not None:
+        hamilton = fresh
+    # Цикл прежнего размера после смены width/height в настройках не годится
+    if hamilton is not None and (hamilton.full_w, hamilton.full_h) != (grid_width, grid_height):
+        hamilton = None
     if hamilton is None:
-        hamilton = HamiltonianCycle(grid_width//2, grid_height//2)
-    
-    # Инициализируем путь и карту только если цикл доступен
-    if hamilton and hamilton.cycle:
-        hamilton_path = [(node.x, node.y) for node in hamilton.cycle]
-        path_map = {pos: i for i, pos in enumerate(hamilton_path)}
-    
-    # Инициализируем змейку
-    snake = [(grid_width//2, grid_height//2)]
-    snake.append((grid_width//2 - 1, grid_height//2))
-    snake.append((grid_width//2 - 2, grid_height//2))
-    direction = (1, 0)
-    add_count = 0
-    
-    # Создаем яблоко
-    available = []
-    for x in range(grid_width):
-        for y in range(grid_height):
-            pos = (x, y)
-            if pos not in snake:
-                available.append(pos)
-    
-    if available:
-        apple = random.choice(available)
+        hamilton = profiler.call("cycle_generation", load_or_generate_cycle, grid_width, grid_height)
+    
+    # Индекс цикла строится один раз на цикл
+    if hamilton and hamilton.cycle_cells:
+        cycle_index = hamilton.index
+    
+    # Создаем игру: змейка и яблоко живут в симуляторе. Seed задаем сами,
+    # чтобы запись игры можно было повторить
+    if game is not None and game.recorder is not None:
+        game.recorder.close()
+    if game is not None and game.telemetry is not None:
+        game.telemetry.game_end(game, "reset")
+    game = SnakeSimulator(hamilton, seed=random.getrandbits(64), auto_mode=auto_mode,
+                          acceleration_mode=acceleration_mode, planner=planner, repair=repair_mode,
+                          **load_tuned_parameters(grid_width, grid_height))
+    profiler.watch(game, "get_next_position", "ai_decision")
+    if telemetry is not None:
+        telemetry.attach(game)
+    start_recording(settings)
+
+def start_telemetry(path):
+    """Телеметрия каждой следующей игры пишется в path (.csv или JSON lines)"""
+    global telemetry
+    from telemetry import Telemetry, TelemetryWriter
+    try:
+        telemetry = Telemetry(TelemetryWriter(path))
+    except OSError as e:
+        print(f"Телеметрии не будет: {e}")
+
+def stop_telemetry():
+    """Итог текущей игры и запись всего, что осталось в буфере"""
+    global telemetry
+    if telemetry is None:
+        return
+    if game is not None:
+        telemetry.game_end(game, "exit")
+    telemetry.close()
+    telemetry = None
+
+def run_headless(ticks=None, telemetry_path=None):
+    """Игра без окна и без pygame, до заполнения поля или ticks тиков"""
+    settings = load_settings()
+    if telemetry_path:
+        start_telemetry(telemetry_path)
+    init_game()
+    done = 0
+    start = time.perf_counter()
+    while not game.completed and (ticks is None or done < ticks):
+        if not game.step():
+            start_recording(settings)
+        done += 1
+    seconds = time.perf_counter() - start
+    if game.recorder is not None:
+        game.recorder.close()
+    stop_telemetry()
+    print(f"Ходов: {game.moves}, яблок: {game.apples_eaten}, столкновений: {game.crashes}, "
+          f"тиков в секунду: {done / max(seconds, 1e-9):.0f}")
 
-def main():
+def main(platform=None, max_frames=None, tray=False, renderer_name=None, telemetry_path=None):
+    """Главный цикл. platform - бэкенд из backends.py (по умолчанию select_backend()),
+    max_frames - остановиться после стольких кадров, для замеров, tray - иконка в трее,
+    renderer_name - отрисовщик из renderer.RENDERERS (по умолчанию select_renderer()),
+    telemetry_path - файл для телеметрии решений ИИ"""
     global hamilton, generating_cycle, screensaver_active, last_activity_time, running
-    global hamilton_path, path_map, snake, direction, add_count, apple, head_cycle_position, last_move_time
-    
-    # Инициализация Pygame
-    pg.init()
+    global cycle_index, auto_mode, acceleration_mode, planner, repair_mode, backend
+    import pygame as pg
+    from renderer import compute_layout, select_renderer, ProfilerHud
+    from backends import select_backend
+    
+    backend = platform or select_backend()
+    backend.configure()
+    if telemetry_path:
+        start_telemetry(telemetry_path)
+    running = True
+    screensaver_active = generating_cycle = False
+    
+    # Инициализация Pygame: только дисплей, шрифты загрузит первая надпись
+    pg.display.init()
+    last_activity_time = backend.time()
     
     # Загрузка настроек
     settings = load_settings()
     
     # Настройка размеров
-    width, height = user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
-    # Рассчитываем размер ячейки так, чтобы они поместились в экран с отступом
-    max_cell_width = (width - 20) // settings["width"]
-    max_cell_height = (height - 20) // settings["height"]
-    cell_size = min(max_cell_width, max_cell_height)
-    
-    # Рассчитываем размеры игрового поля
+    width, height = backend.screen_size()
     grid_width, grid_height = settings["width"], settings["height"]
-    game_width = cell_size * grid_width
-    game_height = cell_size * grid_height
-    
-    # Рассчитываем отступы для центрирования игры на экране
-    margin_x = (width - game_width) // 2
-    margin_y = (height - game_height) // 2
+    # Размер ячейки и отступы для центрирования игры на экране
+    layout = compute_layout(width, height, grid_width, grid_height)
     
     move_interval = settings["delay"]
     
@@ -260,7 +323,8 @@ def main():
     os.environ['SDL_VIDEO_CENTERED'] = '1'
     
     # Используем FULLSCREEN для создания окна без заголовка
-    screen = pg.display.set_mode((width, height), FULLSCREEN | NOFRAME)
+    # NOFRAME есть не во всех сборках pygame, тогда берем значение SDL_NOFRAME
+    screen = pg.display.set_mode((width, height), pg.FULLSCREEN | getattr(pg, "NOFRAME", 0x00000020))
     
     # Скрываем курсор мыши в полноэкранном режиме
     pg.mouse.set_visible(False)
@@ -268,275 +332,142 @@ def main():
     pg.display.set_caption("Snake Screensaver")
     
     # Удаляем окно из таскбара
-    hwnd = pg.display.get_wm_info()["window"]
-    remove_from_taskbar(hwnd)
+    backend.prepare_window()
     
     # Скрываем окно при запуске
     hide_window()
+    if tray:
+        start_tray()
     
     # Инициализация переменных
-    snake.clear()
-    snake.append((grid_width//2, grid_height//2))
-    snake.append((grid_width//2 - 1, grid_height//2))
-    snake.append((grid_width//2 - 2, grid_height//2))
-    direction = (1, 0)
-    apple = None
-    auto_mode = True
     show_path = False
-    last_move_time = 0
-    add_count = 0
-    acceleration_mode = True
+    turbo = False
+    morph = False
+    frame_number = 0
     fpsClock = pg.time.Clock()
     fps = 60
-    
-    # Инициализация переменных AI
-    head_cycle_position = 0
-    tail_cycle_position = 0
-    
-    # Определение функций для игры
-    def get_cycle_position(pos):
-        return path_map.get(pos, -1)
-
-    def get_distance_between_points(from_pos, to_pos):
-        distance = to_pos - from_pos
-        while distance < 0:
-            distance += len(hamilton_path)
-        return distance
-
-    def is_adjacent(pos1, pos2):
-        dx = abs(pos1[0] - pos2[0])
-        dy = abs(pos1[1] - pos2[1])
-        return (dx == 1 and dy == 0) or (dx == 0 and dy == 1)
-
-    def will_overtake_tail(new_pos_cycle):
-        min_distance_between_head_and_tail = 50
-        actual_tail = get_cycle_position(snake[-1])
-        
-        if actual_tail == -1:
-            return True
-        
-        if get_distance_between_points(head_cycle_position, actual_tail) <= min_distance_between_head_and_tail + add_count:
-            return True
-        
-        tail = actual_tail - min_distance_between_head_and_tail - add_count
-        if tail < 0:
-            tail += len(hamilton_path)
-        
-        if get_distance_between_points(head_cycle_position, new_pos_cycle) >= get_distance_between_points(head_cycle_position, tail):
-            return True
-        
-        return False
-
-    def get_next_position(head, tail, apple_pos):
-        global head_cycle_position
-        
-        head_cycle_position = get_cycle_position(head)
-        
-        if head_cycle_position == -1:
-            print("ОШИБКА: Голова змейки не находится на пути цикла Гамильтона!")
-            # Попробуем восстановить позицию головы
-            for i, pos in enumerate(hamilton_path):
-                if pos == head:
-                    head_cycle_position = i
-                    break
-            # Если не удалось, используем безопасный путь
-            if head_cycle_position == -1:
-                return follow_safe_path()
-        
-        apple_cycle_pos = get_cycle_position(apple_pos)
-        
-        possible_next_positions = []
-        for i in range(len(hamilton_path)):
-            if is_adjacent(head, hamilton_path[i]):
-                possible_next_positions.append(i)
-        
-        if acceleration_mode and possible_next_positions:
-            min_dist = float('inf')
-            min_index = 0
-            
-            for i, pos_idx in enumerate(possible_next_positions):
-                distance = apple_cycle_pos - pos_idx
-                while distance < 0:
-                    distance += len(hamilton_path)
-                
-                if will_overtake_tail(pos_idx):
-                    continue
-                
-                if distance < min_dist:
-                    min_dist = distance
-                    min_index = i
-            
-            if min_dist != float('inf'):
-                return hamilton_path[possible_next_positions[min_index]]
-        
-        next_cycle_pos = (head_cycle_position + 1) % len(hamilton_path)
-        return hamilton_path[next_cycle_pos]
-
-    def follow_safe_path():
-        head = snake[0]
-        current_idx = get_cycle_position(head)
-        
-        if current_idx == -1:
-            min_dist = float('inf')
-            closest_idx = 0
-            
-            for i, pos in enumerate(hamilton_path):
-                dist = abs(pos[0] - head[0]) + abs(pos[1] - head[1])
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_idx = i
-            
-            current_idx = closest_idx
-        
-        next_pos = hamilton_path[(current_idx + 1) % len(hamilton_path)]
-        return next_pos
-
-    def get_auto_direction():
-        head = snake[0]
-        tail = snake[-1]
-        next_pos = get_next_position(head, tail, apple)
-        
-        dx = next_pos[0] - head[0]
-        dy = next_pos[1] - head[1]
-        
-        if dx != 0:
-            dx = 1 if dx > 0 else -1
-        if dy != 0:
-            dy = 1 if dy > 0 else -1
-        
-        return (dx, dy)
+    # Скорость змейки задается интервалом тика и не зависит от частоты кадров
+    timestep = FixedTimestep(move_interval)
+    tick_rate = RateCounter()
+    frame_rate = RateCounter()
+    
+    def tick():
+        global hamilton, cycle_index
+        # Вся логика игры в симуляторе, здесь только отсчет времени
+        if morph and game.moves % MORPH_EVERY == 0:
+            game.morph()
+        if not game.step():
+            # Игра началась заново - подменяем цикл на свежий, если он уже готов,
+            # и пишем новую игру в новый файл
+            fresh = cycle_pool.get()
+            size = fresh and (fresh.full_w, fresh.full_h)
+            if fresh is not None and size != (game.width, game.height):
+                if size == (grid_width, grid_height):
+                    # В настройках новый размер поля: новая игра на новом цикле
+                    init_game(fresh)
+                    return
+                # Цикл размера, который в настройках уже сменился
+                fresh = None
+            if fresh is not None:
+                hamilton = fresh
+                cycle_index = hamilton.index
+            game.reset(fresh, seed=random.getrandbits(64))
+            start_recording(load_settings())
 
     def update_snake():
-        global snake, direction, add_count, head_cycle_position, last_move_time, apple
-        current_time = pg.time.get_ticks()
-        
-        if current_time - last_move_time < move_interval:
-            return
-        
-        if auto_mode and hamilton and hamilton_path:
-            new_dir = get_auto_direction()
-            if (new_dir[0] + direction[0], new_dir[1] + direction[1]) != (0, 0):
-                direction = new_dir
-
-        new_head = (
-            snake[0][0] + direction[0],
-            snake[0][1] + direction[1]
-        )
-        
-        if (new_head[0] < 0 or new_head[0] >= grid_width or 
-            new_head[1] < 0 or new_head[1] >= grid_height):
-            reset_game()
-            return
-        
-        if new_head in snake:
-            reset_game()
-            return
-        
-        snake.insert(0, new_head)
-        
-        if new_head == apple:
-            add_count += 4
-            spawn_apple()
+        if turbo:
+            # Без ограничения скорости: тики, пока не кончится бюджет кадра
+            deadline = time.perf_counter() + TURBO_FRAME_BUDGET / 1000
+            ticks = 0
+            while time.perf_counter() < deadline:
+                for _ in range(16):
+                    tick()
+                ticks += 16
         else:
-            if add_count <= 0:
-                snake.pop()
-            else:
-                add_count -= 1
-        
-        last_move_time = current_time
+            timestep.interval = move_interval
+            ticks = timestep.advance(backend.time() * 1000)
+            for _ in range(ticks):
+                tick()
+        tick_rate.add(ticks)
 
-    def draw():
-        if not screensaver_active:
-            # Если скринсейвер не активен, очищаем экран
-            screen.fill((0, 0, 0))
-            return
-            
-        screen.fill((30, 30, 30))
-        
-        # Draw snake
-        for i, (x, y) in enumerate(snake):
-            color_value = max(100, 200 - i * 3)
-            pg.draw.rect(screen, (0, color_value, 0), 
-                        (margin_x + x*cell_size, margin_y + y*cell_size, cell_size-1, cell_size-1))
-        
-        # Draw apple
-        if apple:
-            pg.draw.rect(screen, (200, 10, 10),
-                        (margin_x + apple[0]*cell_size, margin_y + apple[1]*cell_size, cell_size-1, cell_size-1))
-        
-        # Draw path if enabled
-        if show_path and hamilton and hamilton_path:
-            # Draw Hamiltonian cycle
-            points = [(margin_x + x*cell_size + cell_size//2, margin_y + y*cell_size + cell_size//2)
-                    for x, y in hamilton_path]
-            pg.draw.lines(screen, (0, 255, 0, 128), True, points, 2)
-            
-            # Отображаем позиции всех сегментов змейки на цикле
-            for i, segment in enumerate(snake):
-                seg_cycle_pos = get_cycle_position(segment)
-                if seg_cycle_pos != -1:
-                    seg_pos = hamilton_path[seg_cycle_pos]
-                    r = min(255, int(255 * (1 - i / len(snake))))
-                    b = min(255, int(255 * (i / len(snake))))
-                    pg.draw.circle(screen, (r, 100, b), 
-                                (margin_x + seg_pos[0]*cell_size + cell_size//2, 
-                                 margin_y + seg_pos[1]*cell_size + cell_size//2), 3)
-                
-            # Отображение информации отладки
-            real_tail_position = get_cycle_position(snake[-1])
-            font = pg.font.SysFont(None, 24)
-            text = font.render(f"Head: {head_cycle_position}, Tail: {real_tail_position}, Len: {len(snake)}", True, (255, 255, 255))
-            screen.blit(text, (margin_x + 10, margin_y + 10))
+    # Рисует только изменившиеся клетки (или всё поле через numpy), линия цикла
+    # кэшируется на поверхности
+    renderer = select_renderer(screen, layout, renderer_name)
+    renderer_grid = (grid_width, grid_height)
+    hud = ProfilerHud(profiler)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, request_profile_dump)
 
-    def spawn_apple():
-        global apple
-        available = []
-        for x in range(grid_width):
-            for y in range(grid_height):
-                pos = (x, y)
-                if pos not in snake:
-                    available.append(pos)
-        
-        if available:
-            apple = random.choice(available)
+    def fit_renderer():
+        """После смены размера поля отрисовщик и отступы пересчитываются под новую игру"""
+        nonlocal layout, renderer, renderer_grid
+        grid = (game.width, game.height)
+        if grid == renderer_grid:
+            return
+        renderer_grid = grid
+        layout = compute_layout(width, height, *grid)
+        renderer = select_renderer(screen, layout, renderer_name)
 
-    def reset_game():
-        global snake, direction, add_count
-        snake = [(grid_width//2, grid_height//2)]
-        snake.append((grid_width//2 - 1, grid_height//2))
-        snake.append((grid_width//2 - 2, grid_height//2))
-        direction = (1, 0)
-        add_count = 0
-        spawn_apple()
+    def draw():
+        """Список измененных прямоугольников или None, если кадр нарисован целиком"""
+        fit_renderer()
+        status = f"FPS: {frame_rate.rate():.0f}, TPS: {tick_rate.rate():.0f}"
+        if turbo:
+            status += " (turbo)"
+        if morph:
+            status += " (morph)"
+        overlay = None
+        if profiler.enabled:
+            overlay = (hud.surface(tick_rate.rate(), frame_rate.rate()), (10, 10))
+        return renderer.draw(game, show_path, status, overlay)
 
-    # Инициализируем игру
-    spawn_apple()
-    
     # Главный цикл
-    while running:
+    while running and frame_number != max_frames:
         for event in pg.event.get():
-            if event.type == QUIT:
+            if event.type == pg.QUIT:
                 running = False
-            if event.type == KEYDOWN:
-                if event.key == K_ESCAPE:
+            if event.type == pg.KEYDOWN:
+                if event.key == pg.K_ESCAPE:
                     running = False
                 if screensaver_active:
-                    if event.key == K_p:
+                    if event.key == pg.K_p:
                         show_path = not show_path
-                    elif event.key == K_a:
+                    elif event.key == pg.K_h:
+                        profiler.toggle()
+                    elif event.key == pg.K_j:
+                        request_profile_dump()
+                    elif event.key == pg.K_t:
+                        turbo = not turbo
+                        timestep.reset()
+                    elif event.key == pg.K_m:
+                        morph = not morph
+                    elif event.key == pg.K_r:
+                        # Действует только с планировщиком lookahead (simulator.REPAIR_PLANNERS)
+                        repair_mode = not repair_mode
+                        game.repair = repair_mode
+                    elif event.key == pg.K_a:
                         auto_mode = not auto_mode
-                    elif event.key == K_s:
-                        acceleration_mode = not acceleration_mode
+                        game.auto_mode = auto_mode
+                    elif event.key == pg.K_s:
+                        # Без срезок -> жадные срезки -> планировщик -> без срезок
+                        if not acceleration_mode:
+                            acceleration_mode, planner = True, "greedy"
+                        elif planner == "greedy":
+                            planner = "lookahead"
+                        else:
+                            acceleration_mode = False
+                        game.acceleration_mode = acceleration_mode
+                        game.planner = planner
                     elif not auto_mode:  # Manual control when auto mode is off
-                        if event.key == K_UP and direction != (0, 1):
-                            direction = (0, -1)
-                        elif event.key == K_DOWN and direction != (0, -1):
-                            direction = (0, 1)
-                        elif event.key == K_LEFT and direction != (1, 0):
-                            direction = (-1, 0)
-                        elif event.key == K_RIGHT and direction != (-1, 0):
-                            direction = (1, 0)
-            if event.type == MOUSEBUTTONDOWN:
+                        if event.key == pg.K_UP:
+                            game.turn((0, -1))
+                        elif event.key == pg.K_DOWN:
+                            game.turn((0, 1))
+                        elif event.key == pg.K_LEFT:
+                            game.turn((-1, 0))
+                        elif event.key == pg.K_RIGHT:
+                            game.turn((1, 0))
+            if event.type == pg.MOUSEBUTTONDOWN:
                 if screensaver_active:
                     if event.button == 4:
                         move_interval = max(1, move_interval - 10)
@@ -544,32 +475,82 @@ def main():
                         move_interval = min(200, move_interval + 10)
         
         # Проверка активности пользователя
-        check_activity()
+        profiler.call("check_activity", check_activity)
+        if profile_dump_requested:
+            dump_profile()
+        
+        # settings.txt изменился: задержка действует сразу, а цикл нового размера
+        # строится в фоне и подменяет игру на следующем сбросе (см. tick)
+        changed = config.poll(backend.time())
+        if "delay" in changed:
+            move_interval = config.settings["delay"]
+        if changed & {"width", "height"}:
+            grid_width, grid_height = config.settings["width"], config.settings["height"]
+            hamilton = None
+        
+        # Циклы готовятся в фоне, пока скринсейвер нужен, и отменяются при активности
+        if generating_cycle or screensaver_active:
+            cycle_pool.start(grid_width, grid_height)
+        else:
+            cycle_pool.stop()
         
-        # Если нужно сгенерировать цикл, делаем это
-        if generating_cycle and hamilton is None:
-            hamilton = HamiltonianCycle(grid_width//2, grid_height//2)
+        # Берем первый готовый цикл, не блокируя кадр. Пока игра идет, свежие
+        # циклы забирает tick
+        if generating_cycle and not screensaver_active and hamilton is None:
+            hamilton = cycle_pool.get()
             # Подготавливаем игру сразу после генерации цикла
-            if hamilton and hamilton.cycle:
-                hamilton_path = [(node.x, node.y) for node in hamilton.cycle]
-                path_map = {pos: i for i, pos in enumerate(hamilton_path)}
+            if hamilton and hamilton.cycle_cells:
+                cycle_index = hamilton.index
             
         # Если скринсейвер активен, обновляем игру
         if screensaver_active:
-            update_snake()
+            profiler.call("update_snake", update_snake)
+        else:
+            # Время, пока окно скрыто, не должно превращаться в тики
+            timestep.reset()
+            # Скрытое окно не рисуем, при показе кадр будет нарисован целиком
+            renderer.invalidate()
+            frame_number += 1
+            if generating_cycle:
+                backend.wait_frame(fpsClock, fps)
+            else:
+                # Спящий режим: ждем событий или таймера простоя
+                backend.sleep(dormant_timeout())
+            continue
             
-        # Отрисовка
-        draw()
-        pg.display.flip()
-        fpsClock.tick(fps)
-    
+        # Отрисовка: в турбо-режиме выводим только каждый N-й кадр
+        frame_number += 1
+        if not turbo or frame_number % TURBO_RENDER_EVERY == 0:
+            rects = profiler.call("draw", draw)
+            if rects is None:
+                profiler.call("flip", pg.display.flip)
+            elif rects:
+                profiler.call("flip", pg.display.update, rects)
+            frame_rate.add()
+        if not turbo:
+            backend.wait_frame(fpsClock, fps)
+    
+    cycle_pool.stop()
+    if game is not None and game.recorder is not None:
+        game.recorder.close()
+    stop_telemetry()
     pg.quit()
-    sys.exit()
 
 if __name__ == "__main__":
-    # Запускаем иконку в трее в отдельном потоке
-    tray_thread = threading.Thread(target=create_tray_icon, daemon=True)
-    tray_thread.start()
-    
-    # Запускаем основную программу
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Змейка-скринсейвер")
+    parser.add_argument("--headless", action="store_true",
+                        help="играть без окна, не загружая pygame, и вывести итог")
+    parser.add_argument("--ticks", type=int, help="в режиме --headless: остановиться после стольких тиков")
+    parser.add_argument("--renderer", choices=["dirty", "numpy"],
+                        help="отрисовщик: dirty - только изменившиеся клетки, numpy - всё поле "
+                             "одним массивом, для очень больших полей")
+    parser.add_argument("--telemetry", metavar="PATH",
+                        help="писать счетчики и события решений ИИ в PATH (.csv или JSON lines)")
+    args = parser.parse_args()
+    if args.headless:
+        run_headless(args.ticks, args.telemetry)
+    else:
+        # Иконка в трее запускается, когда окно уже создано
+        main(tray=True, renderer_name=args.renderer, telemetry_path=args.telemetry)
+    sys.exit()
\ No newline at end of file
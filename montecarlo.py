@@ -0,0 +1,144 @@
+# montecarlo.py
+"""Много игр с разными seed на пуле процессов.
+
+Запуск: python montecarlo.py --games 1000 --width 24 --height 16 [--seed 0]
+                             [--workers 8] [--planner lookahead] [--repair]
+                             [--tree wilson] [--min-distance 50] [--growth 4]
+                             [--output games.jsonl]
+
+Игра номер i получает seed = --seed + i. Из seed детерминированно строятся и
+гамильтонов цикл, и последовательность яблок, поэтому один и тот же seed всегда
+дает одну и ту же игру, независимо от числа процессов и порядка выполнения.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from config import MIN_GRID_SIZE
+from hamiltonial import HamiltonianCycle, SPANNING_TREES
+from simulator import (SnakeSimulator, PLANNERS, REPAIR_PLANNERS, MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL,
+                       APPLE_GROWTH)
+
+def play_game(task):
+    """Строит цикл и играет одну игру до конца. Выполняется в процессе пула"""
+    (seed, grid_width, grid_height, acceleration_mode, max_moves, planner, repair, tree,
+     min_distance, apple_growth) = task
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    hamilton = HamiltonianCycle(grid_width // 2, grid_height // 2, rng=rng, tree_strategy=tree)
+    generation_time = time.perf_counter() - start
+
+    game = SnakeSimulator(hamilton, seed=rng.getrandbits(64), acceleration_mode=acceleration_mode,
+                          planner=planner, repair=repair, min_distance=min_distance,
+                          apple_growth=apple_growth)
+    start = time.perf_counter()
+    result = game.run_until_complete(max_moves)
+    play_time = time.perf_counter() - start
+
+    # После столкновения игра уже сброшена, поэтому считаем ходы только для побед
+    return {
+        "seed": seed,
+        "completed": result is not None,
+        "crashed": game.crashes > 0,
+        "moves": result,
+        "shortcuts": game.shortcuts if result is not None else None,
+        "generation_time": generation_time,
+        "play_time": play_time,
+    }
+
+def run_games(games, grid_width, grid_height, base_seed=0, workers=None,
+              acceleration_mode=True, max_moves=None, planner="greedy", repair=False,
+              tree="frontier", min_distance=MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL,
+              apple_growth=APPLE_GROWTH):
+    """Раздает игры по пулу процессов и отдает результаты по мере готовности"""
+    tasks = [(base_seed + i, grid_width, grid_height, acceleration_mode, max_moves, planner, repair, tree,
+              min_distance, apple_growth) for i in range(games)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(play_game, tasks)
+        return
+
+    # Крупные порции, чтобы пересылка между процессами не мешала масштабированию
+    chunksize = max(1, games // (workers * 8))
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(play_game, tasks, chunksize)
+
+def percentile(values, p):
+    """Перцентиль p (0..100) методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+def summarize(results):
+    """Перцентили ходов до победы, доля срезок и время генерации цикла"""
+    wins = [r for r in results if r["completed"]]
+    moves = [r["moves"] for r in wins]
+    shortcut_rates = [r["shortcuts"] / r["moves"] for r in wins if r["moves"]]
+    generation = [r["generation_time"] for r in results]
+    summary = {
+        "games": len(results),
+        "wins": len(wins),
+        "win_rate": len(wins) / len(results) if results else None,
+    }
+    for name, values in (("moves", moves), ("shortcut_rate", shortcut_rates),
+                         ("generation_time", generation)):
+        for p in (50, 90, 99):
+            summary[f"{name}_p{p}"] = percentile(values, p)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Монте-Карло прогон игр змейки")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--width", type=int, default=24)
+    parser.add_argument("--height", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0, help="seed первой игры")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--max-moves", type=int, default=None)
+    parser.add_argument("--no-acceleration", action="store_true", help="без срезок, строго по циклу")
+    parser.add_argument("--planner", choices=PLANNERS, default="greedy", help="стратегия срезок")
+    parser.add_argument("--repair", action="store_true",
+                        help="перестраивать цикл к каждому яблоку (только с --planner lookahead)")
+    parser.add_argument("--tree", choices=SPANNING_TREES, default="frontier",
+                        help="как строится остовное дерево цикла")
+    parser.add_argument("--min-distance", type=int, default=MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL,
+                        help="запас до хвоста для срезок")
+    parser.add_argument("--growth", type=int, default=APPLE_GROWTH, help="сегментов за яблоко")
+    parser.add_argument("--output", help="файл JSON lines для результатов каждой игры")
+    args = parser.parse_args()
+
+    if args.width % 2 or args.height % 2 or min(args.width, args.height) < MIN_GRID_SIZE:
+        parser.error(f"width и height должны быть четными и не меньше {MIN_GRID_SIZE}")
+    if args.repair and args.planner not in REPAIR_PLANNERS:
+        parser.error(f"--repair работает только со стратегиями: {', '.join(REPAIR_PLANNERS)}")
+
+    results = []
+    out = open(args.output, "w") if args.output else None
+    start = time.perf_counter()
+    try:
+        for result in run_games(args.games, args.width, args.height, args.seed, args.workers,
+                                not args.no_acceleration, args.max_moves, args.planner,
+                                args.repair, args.tree, args.min_distance, args.growth):
+            results.append(result)
+            if out:
+                out.write(json.dumps(result) + "\n")
+            if len(results) % max(1, args.games // 10) == 0:
+                print(f"{len(results)}/{args.games}", file=sys.stderr)
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(results)
+    summary["elapsed"] = elapsed
+    summary["games_per_second"] = len(results) / elapsed if elapsed else None
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
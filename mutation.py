@@ -0,0 +1,432 @@
+# mutation.py
+"""Перестройка гамильтонова цикла заменой одного ребра остовного дерева.
+
+Цикл - это обход вокруг остовного дерева базовой сетки: вершина дерева - блок
+2x2 клеток, и внутренняя сторона блока входит в цикл, только если через нее
+не проходит ребро дерева. Если убрать ребро e, цикл распадается на отрезок S
+(обход отрезанного поддерева) и остальное. Новое ребро f снова соединяет
+части, и S встает в другое место цикла, сдвинутый по кругу. Меняются связи
+только в четырех блоках 2x2 на концах e и f.
+
+Порядок клеток хранится в BlockOrder - списке блоков примерно по sqrt(n)
+клеток. Позиция клетки - O(1), перенос отрезка - O(sqrt(n)), весь цикл не
+перенумеровывается.
+
+validate_cycle() проверяет цикл и порядок тела змейки на нем целиком, за O(n).
+"""
+import math
+from bisect import bisect_right
+from collections import namedtuple
+
+# Замена ребра removed на added: отрезок [start, start + length) по кругу
+# становится после позиции after, начиная с позиции start + rotate
+Flip = namedtuple("Flip", "removed added start length rotate after")
+
+def position_after(flip, pos, n):
+    """Позиция pos после замены flip, считая от новой нулевой позиции
+    (клетки, что шла сразу за отрезком). Годится для расстояний по циклу"""
+    rel = (pos - flip.start) % n
+    before = (flip.after - flip.start) % n + 1 - flip.length
+    if rel >= flip.length:
+        rel -= flip.length
+        return rel if rel < before else rel + flip.length
+    if rel >= flip.rotate:
+        return before + rel - flip.rotate
+    return before + flip.length - flip.rotate + rel
+
+def validate_cycle(index, body=()):
+    """ValueError, если index - не гамильтонов цикл поля или клетки тела
+    (от головы к хвосту) идут по нему не по порядку"""
+    width, height = index.width, index.height
+    n = index.length
+    if n != width * height:
+        raise ValueError(f"Цикл из {n} клеток на поле {width}x{height}")
+    cells = list(index.cell_at)
+    if sorted(cells) != list(range(n)):
+        raise ValueError("Цикл проходит не по всем клеткам или по одной дважды")
+    for pos, cell in enumerate(cells):
+        if index.pos_of[cell] != pos:
+            raise ValueError(f"Клетка {cell} на позиции {pos}, а индекс говорит {index.pos_of[cell]}")
+        (ax, ay), (bx, by) = divmod(cells[pos - 1], height), divmod(cell, height)
+        if abs(ax - bx) + abs(ay - by) != 1:
+            raise ValueError(f"Разрыв цикла между позициями {pos - 1} и {pos}")
+    if body and not body_in_order(index, body):
+        raise ValueError("Клетки тела идут по циклу не по порядку от хвоста к голове")
+
+def body_in_order(index, body):
+    """Идут ли клетки тела (от головы к хвосту) по циклу по порядку, O(длина тела)"""
+    n = index.length
+    tail = index.position(body[-1])
+    previous = -1
+    for segment in reversed(body):
+        rel = (index.position(segment) - tail) % n
+        if rel <= previous:
+            return False
+        previous = rel
+    return True
+
+class _Block:
+    __slots__ = ("cells", "start")
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.start = 0
+
+class BlockOrder:
+    """Порядок клеток по циклу, разбитый на блоки"""
+
+    def __init__(self, cells, size, block_size=None):
+        self.length = len(cells)
+        self.block_size = block_size or max(16, math.isqrt(self.length))
+        self.block_of = [None] * size
+        self.offset = [0] * size
+        self.blocks = [self._adopt(_Block(list(cells[i:i + self.block_size])), 0)
+                       for i in range(0, self.length, self.block_size)]
+        self._restart()
+
+    def position(self, cell):
+        return self.block_of[cell].start + self.offset[cell]
+
+    def cell(self, pos):
+        block = self.blocks[bisect_right(self.starts, pos) - 1]
+        return block.cells[pos - block.start]
+
+    def cells(self):
+        return [cell for block in self.blocks for cell in block.cells]
+
+    def splice(self, start, length, rotate, after):
+        """Вырезает отрезок [start, start + length) по кругу, делает первой его
+        клетку start + rotate и вставляет отрезок после позиции after"""
+        n = self.length
+        after = (after - start) % n
+        if not (0 <= rotate < length <= after < n):
+            raise ValueError("Место вставки внутри отрезка")
+        # Поворачиваем весь порядок, чтобы отрезок начинался с нуля
+        i = self._split(start)
+        self.blocks = self.blocks[i:] + self.blocks[:i]
+        self._restart()
+        # Разрезы по возрастанию позиций, чтобы номера блоков не съезжали
+        r = self._split(rotate)
+        m = self._split(length)
+        x = self._split(after + 1)
+        blocks = self.blocks
+        self.blocks = blocks[m:x] + blocks[r:m] + blocks[:r] + blocks[x:]
+        self._merge_small()
+        self._restart()
+
+    def _adopt(self, block, first):
+        """Записывает клетки block.cells[first:] за этим блоком"""
+        block_of = self.block_of
+        offset = self.offset
+        cells = block.cells
+        for k in range(first, len(cells)):
+            block_of[cells[k]] = block
+            offset[cells[k]] = k
+        return block
+
+    def _split(self, pos):
+        """Номер блока, который начинается с позиции pos (блок при надобности режется)"""
+        if pos >= self.length:
+            return len(self.blocks)
+        i = bisect_right(self.starts, pos) - 1
+        block = self.blocks[i]
+        k = pos - block.start
+        if k == 0:
+            return i
+        tail = self._adopt(_Block(block.cells[k:]), 0)
+        del block.cells[k:]
+        tail.start = pos
+        self.blocks.insert(i + 1, tail)
+        self.starts.insert(i + 1, pos)
+        return i + 1
+
+    def _merge_small(self):
+        """Склеивает соседние блоки, пока вместе они не больше block_size"""
+        merged = [self.blocks[0]]
+        for block in self.blocks[1:]:
+            last = merged[-1]
+            if len(last.cells) + len(block.cells) <= self.block_size:
+                first = len(last.cells)
+                last.cells.extend(block.cells)
+                self._adopt(last, first)
+            else:
+                merged.append(block)
+        self.blocks = merged
+
+    def _restart(self):
+        start = 0
+        starts = []
+        for block in self.blocks:
+            block.start = start
+            starts.append(start)
+            start += len(block.cells)
+        self.starts = starts
+
+class _CellAt:
+    """Позиция -> клетка, как CycleIndex.cell_at"""
+
+    def __init__(self, order):
+        self.order = order
+
+    def __len__(self):
+        return self.order.length
+
+    def __iter__(self):
+        return iter(self.order.cells())
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.order.cells()[key]
+        if key < 0:
+            key += self.order.length
+        return self.order.cell(key)
+
+class _PosOf:
+    """Клетка -> позиция, как CycleIndex.pos_of"""
+
+    def __init__(self, order):
+        self.order = order
+
+    def __len__(self):
+        return len(self.order.block_of)
+
+    def __getitem__(self, cell):
+        return self.order.position(cell)
+
+class _Neighbors:
+    """Четыре позиции соседей на каждую позицию, как CycleIndex.neighbors"""
+
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return 4 * self.view.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1 and start % 4 == 0 and stop == start + 4:
+                return self.view.neighbor_row(start // 4)
+            return [self[k] for k in range(start, stop, step)]
+        return self.view.neighbor_row(key // 4)[key % 4]
+
+class CycleView:
+    """То же, что hamiltonial.CycleIndex, но поверх BlockOrder.
+
+    Каждая перестройка цикла дает новый CycleView, поэтому кэши, которые
+    сравнивают индекс по ссылке (линия пути в renderer), видят изменение.
+    """
+
+    def __init__(self, order, width, height):
+        self.order = order
+        self.width = width
+        self.height = height
+        self.length = order.length
+        self.cell_at = _CellAt(order)
+        self.pos_of = _PosOf(order)
+        self.neighbors = _Neighbors(self)
+
+    def __len__(self):
+        return self.length
+
+    def position(self, pos):
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.order.position(y + self.height * x)
+        return -1
+
+    def cell(self, i):
+        return divmod(self.order.cell(i), self.height)
+
+    def next_position(self, i):
+        return (i + 1) % self.length
+
+    def distance(self, from_pos, to_pos):
+        return (to_pos - from_pos) % self.length
+
+    def neighbor_row(self, i):
+        """Позиции левого, верхнего, нижнего и правого соседа по возрастанию, -1 если соседа нет"""
+        height = self.height
+        x, y = divmod(self.order.cell(i), height)
+        position = self.order.position
+        cell = y + height * x
+        return sorted((
+            position(cell - height) if x > 0 else -1,
+            position(cell - 1) if y > 0 else -1,
+            position(cell + 1) if y < height - 1 else -1,
+            position(cell + height) if x < self.width - 1 else -1,
+        ))
+
+    def neighbor_positions(self, i):
+        return [p for p in self.neighbor_row(i) if p != -1]
+
+class CycleMutator:
+    """Остовное дерево и порядок цикла, которые меняются заменой ребер.
+
+    Вершины базовой сетки нумеруются как в HamiltonianCycle: y + base_h * x.
+    Ребро - пара (a, b) с a < b.
+    """
+
+    def __init__(self, hamilton):
+        self.base_w = hamilton.base_w
+        self.base_h = hamilton.base_h
+        self.width = hamilton.full_w
+        self.height = hamilton.full_h
+        self.order = BlockOrder(hamilton.cycle_cells, self.width * self.height)
+        self.adjacent = [set() for _ in range(self.base_w * self.base_h)]
+        for a, b in hamilton.spanning_tree:
+            self.adjacent[a].add(b)
+            self.adjacent[b].add(a)
+        self.flips = 0
+        self._view = None
+
+    @property
+    def index(self):
+        """CycleView текущего цикла"""
+        if self._view is None:
+            self._view = CycleView(self.order, self.width, self.height)
+        return self._view
+
+    def cycle_cells(self):
+        return self.order.cells()
+
+    def tree_edges(self):
+        return [(a, b) for a, others in enumerate(self.adjacent) for b in others if a < b]
+
+    def plan(self, removed, added):
+        """Flip для замены ребра дерева removed на ребро сетки added"""
+        removed = tuple(sorted(removed))
+        added = tuple(sorted(added))
+        if removed[1] not in self.adjacent[removed[0]]:
+            raise ValueError(f"Ребра {removed} нет в дереве")
+        if added[1] in self.adjacent[added[0]] or not self._grid_edge(*added):
+            raise ValueError(f"Ребро {added} уже в дереве или не ребро сетки")
+        flip = self._plan(removed, added)
+        if flip is None:
+            raise ValueError(f"Без ребра {removed} ребро {added} не соединяет части дерева")
+        return flip
+
+    def apply(self, flip):
+        """Применяет Flip из plan() или propose()"""
+        self.order.splice(flip.start, flip.length, flip.rotate, flip.after)
+        (u, v), (a, b) = flip.removed, flip.added
+        self.adjacent[u].discard(v)
+        self.adjacent[v].discard(u)
+        self.adjacent[a].add(b)
+        self.adjacent[b].add(a)
+        self.flips += 1
+        self._view = None
+
+    def flip(self, removed, added):
+        self.apply(self.plan(removed, added))
+
+    def propose(self, rng):
+        """Случайная допустимая замена рядом со случайным ребром сетки, или None.
+
+        Новое ребро - случайное ребро сетки не из дерева, убирается одно из
+        ребер дерева у его концов, если без него новое ребро соединяет части.
+        """
+        a = rng.randrange(len(self.adjacent))
+        x, y = divmod(a, self.base_h)
+        others = [b for b, ok in ((a - self.base_h, x > 0), (a - 1, y > 0),
+                                  (a + 1, y < self.base_h - 1),
+                                  (a + self.base_h, x < self.base_w - 1)) if ok]
+        b = rng.choice(others)
+        if b in self.adjacent[a]:
+            return None
+        added = (min(a, b), max(a, b))
+        flips = []
+        for node in added:
+            for other in sorted(self.adjacent[node]):
+                flip = self._plan((min(node, other), max(node, other)), added)
+                if flip is not None:
+                    flips.append(flip)
+        return rng.choice(flips) if flips else None
+
+    def flips_near(self, nodes):
+        """Все допустимые замены, где новое ребро касается одной из вершин nodes"""
+        seen = set()
+        for a in nodes:
+            x, y = divmod(a, self.base_h)
+            for b, ok in ((a - self.base_h, x > 0), (a - 1, y > 0),
+                          (a + 1, y < self.base_h - 1), (a + self.base_h, x < self.base_w - 1)):
+                added = (min(a, b), max(a, b))
+                if not ok or b in self.adjacent[a] or added in seen:
+                    continue
+                seen.add(added)
+                for node in added:
+                    for other in sorted(self.adjacent[node]):
+                        flip = self._plan((min(node, other), max(node, other)), added)
+                        if flip is not None:
+                            yield flip
+
+    def node_of(self, cell):
+        """Вершина базовой сетки, в блоке которой лежит клетка"""
+        x, y = divmod(cell, self.height)
+        return y // 2 + self.base_h * (x // 2)
+
+    def nodes_around(self, node, radius=1):
+        x, y = divmod(node, self.base_h)
+        return [ny + self.base_h * nx
+                for nx in range(max(0, x - radius), min(self.base_w, x + radius + 1))
+                for ny in range(max(0, y - radius), min(self.base_h, y + radius + 1))]
+
+    def _grid_edge(self, a, b):
+        (ax, ay), (bx, by) = divmod(a, self.base_h), divmod(b, self.base_h)
+        return abs(ax - bx) + abs(ay - by) == 1
+
+    def _cell(self, node, dx, dy):
+        x, y = divmod(node, self.base_h)
+        return (2 * x + dx) * self.height + 2 * y + dy
+
+    def _links(self, a, b):
+        """Связи цикла вокруг ребра (a, b): две связи через ребро, если оно в
+        дереве, и по одной внутренней стороне в блоках a и b, если нет"""
+        cell = self._cell
+        if b == a + self.base_h:  # b справа
+            crossing = ((cell(a, 1, 0), cell(b, 0, 0)), (cell(a, 1, 1), cell(b, 0, 1)))
+            return crossing, (cell(a, 1, 0), cell(a, 1, 1)), (cell(b, 0, 0), cell(b, 0, 1))
+        # b снизу
+        crossing = ((cell(a, 0, 1), cell(b, 0, 0)), (cell(a, 1, 1), cell(b, 1, 0)))
+        return crossing, (cell(a, 0, 1), cell(a, 1, 1)), (cell(b, 0, 0), cell(b, 1, 0))
+
+    def _plan(self, removed, added):
+        n = self.order.length
+        position = self.order.position
+
+        def adjacent(link):
+            """Позиция первой клетки связи по ходу цикла"""
+            p, q = position(link[0]), position(link[1])
+            if (q - p) % n == 1:
+                return p
+            if (p - q) % n == 1:
+                return q
+            raise RuntimeError(f"Связи {link} нет в цикле, дерево и цикл разошлись")
+
+        # Отрезок S - обход части дерева со стороны removed[1]: между входом
+        # в нее через одну связь removed и выходом через другую
+        crossing, _, _ = self._links(*removed)
+        start = end = None
+        for outer, inner in crossing:
+            if adjacent((outer, inner)) == position(outer):
+                start = position(inner)
+            else:
+                end = position(inner)
+        length = (end - start) % n + 1
+
+        def in_segment(node):
+            return (position(self._cell(node, 0, 0)) - start) % n < length
+
+        a, b = added
+        if in_segment(a) == in_segment(b):
+            return None
+        crossing, side_a, side_b = self._links(a, b)
+        outer, inner = (side_b, side_a) if in_segment(a) else (side_a, side_b)
+        after = adjacent(outer)
+        # Отрезок начнется с той клетки внутренней стороны, что идет второй
+        rotate = (adjacent(inner) + 1 - start) % n
+        first = self.order.cell((start + rotate) % n)
+        partner = dict(crossing + tuple((q, p) for p, q in crossing))
+        if partner[self.order.cell(after)] != first:
+            raise RuntimeError("Обход отрезка развернулся бы, цикл не из остовного дерева")
+        return Flip(removed, added, start, length, rotate, after)
@@ -0,0 +1,59 @@
+# planner.py
+"""Планировщик срезок на несколько ходов вперед.
+
+Жадный ИИ выбирает на каждом тике одного соседа, ближайшего к яблоку по
+циклу. Планировщик ищет поиском в ширину кратчайший по числу ходов путь до
+яблока, на котором позиции на цикле строго растут и все лежат ближе границы
+shortcut_limit(). Для каждого хода пути выполняется то же условие, что и для
+жадной срезки, а хвост со временем только отодвигает границу, поэтому путь
+остается допустимым до самого яблока.
+"""
+from collections import deque
+
+# Дальше этой дистанции по циклу путь не ищем: поиск обходит не больше
+# клеток, чем дистанция до яблока, так что время одного поиска ограничено
+PLAN_MAX_DISTANCE = 4096
+# Запас до хвоста для планировщика - доля длины цикла (но не меньше
+# MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL). Голова, прижатая к хвосту, оставляет
+# за собой много пропущенных клеток, и яблоки в них стоят целого круга
+LOOKAHEAD_MARGIN = 0.35
+
+def plan_path(index, occupied, head_pos, target_pos, limit):
+    """Кратчайший путь от head_pos до target_pos по позициям цикла.
+
+    Позиции на пути строго растут (считая от головы), меньше limit и их клетки
+    свободны. Возвращает список позиций без head_pos или None.
+    """
+    length = index.length
+    target = (target_pos - head_pos) % length
+    if target == 0 or target >= limit or target > PLAN_MAX_DISTANCE:
+        return None
+
+    cell_at = index.cell_at
+    neighbors = index.neighbors
+    parent = {head_pos: -1}
+    frontier = deque([head_pos])
+    while frontier:
+        pos = frontier.popleft()
+        if pos == target_pos:
+            break
+        rel = (pos - head_pos) % length
+        start = pos * 4
+        for nxt in neighbors[start:start + 4]:
+            if nxt == -1 or nxt in parent:
+                continue
+            nxt_rel = (nxt - head_pos) % length
+            if nxt_rel <= rel or nxt_rel > target or occupied[cell_at[nxt]]:
+                continue
+            parent[nxt] = pos
+            frontier.append(nxt)
+    else:
+        return None
+
+    path = []
+    pos = target_pos
+    while pos != head_pos:
+        path.append(pos)
+        pos = parent[pos]
+    path.reverse()
+    return path
@@ -0,0 +1,113 @@
+# pregen.py
+"""Фоновая подготовка гамильтоновых циклов.
+
+Цикл строится в отдельном процессе (чтобы не держать GIL главного цикла) и
+сохраняется в CycleCache. Фоновый поток загружает его из кэша через mmap,
+заранее строит CycleIndex и кладет готовый цикл в небольшую очередь. Главному
+циклу остается только забрать готовый объект через get().
+"""
+import queue
+import random
+import threading
+import time
+
+from cycle_cache import CycleCache
+
+def generate_to_cache(cache_dir, max_bytes, width, height, seed):
+    """Строит цикл и пишет его в кэш. Выполняется в процессе-генераторе"""
+    CycleCache(cache_dir, max_bytes).get_or_create(width, height, seed)
+    return seed
+
+class CyclePool:
+    def __init__(self, cache, size=2, profiler=None):
+        self.cache = cache
+        self.size = size
+        # Время генерации каждого цикла уходит в profiler.record("cycle_generation")
+        self.profiler = profiler
+        self.grid = None
+        self._queue = queue.Queue(size)
+        self._stop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, width, height):
+        """Запускает подготовку циклов для поля width x height (повторный вызов ничего не делает)"""
+        if (width, height) != self.grid:
+            # Готовые циклы другого размера больше не нужны
+            self.stop()
+            self.grid = (width, height)
+            self._queue = queue.Queue(self.size)
+        if self.running and not self._stop.is_set():
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(width, height, self._queue, self._stop),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Отменяет подготовку, не дожидаясь процесса-генератора. Готовые циклы остаются в очереди"""
+        if self._stop is not None:
+            self._stop.set()
+
+    def get(self):
+        """Готовый цикл или None, никогда не блокирует"""
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def ready(self):
+        return self._queue.qsize()
+
+    def _run(self, width, height, ready, stop):
+        process_pool = None
+        # Сначала отдаем цикл из кэша, если он есть - это мгновенно
+        seeds = self.cache.seeds(width, height)
+        first = self.cache.load(width, height, random.choice(seeds)) if seeds else None
+        try:
+            while not stop.is_set():
+                if ready.full():
+                    stop.wait(0.1)
+                    continue
+
+                hamilton, first = first, None
+                if hamilton is None:
+                    if process_pool is None:
+                        # multiprocessing грузим только когда кэш пуст
+                        import multiprocessing
+                        process_pool = multiprocessing.Pool(1)
+                    seed = random.getrandbits(32)
+                    started = time.perf_counter()
+                    result = process_pool.apply_async(
+                        generate_to_cache,
+                        (self.cache.directory, self.cache.max_bytes, width, height, seed))
+                    while not result.ready():
+                        if stop.wait(0.05):
+                            return
+                    try:
+                        result.get()
+                    except Exception as e:
+                        print(f"Ошибка фоновой генерации цикла: {e}")
+                        stop.wait(1)
+                        continue
+                    if self.profiler is not None:
+                        self.profiler.record("cycle_generation", time.perf_counter() - started)
+                    hamilton = self.cache.load(width, height, seed)
+                    if hamilton is None:
+                        continue
+
+                # Индекс строим здесь, а не в кадре, где цикл будет подменен
+                hamilton.index
+                while not stop.is_set():
+                    try:
+                        ready.put(hamilton, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+        finally:
+            if process_pool is not None:
+                # Отмена прерывает и незаконченную генерацию
+                process_pool.terminate()
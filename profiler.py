@@ -0,0 +1,141 @@
+# profiler.py
+"""Замеры времени фаз главного цикла в кольцевых буферах.
+
+Каждая фаза (PHASES) хранит последние RING_SIZE замеров. Пока профилировщик
+выключен, call() просто вызывает функцию, а обертки watch() вообще не
+установлены, так что горячий путь (решение ИИ на каждом тике) ничего не платит.
+"""
+import json
+import time
+from array import array
+from bisect import bisect_right
+
+PHASES = ("check_activity", "update_snake", "ai_decision", "draw", "flip", "cycle_generation")
+RING_SIZE = 1024
+# Границы корзин гистограммы в миллисекундах: от 1 мкс, каждая вдвое шире
+HISTOGRAM_EDGES = [0.001 * 2 ** i for i in range(21)]
+
+class TimingRing:
+    """Последние size замеров в секундах"""
+
+    def __init__(self, size=RING_SIZE):
+        self.samples = array("d", bytes(8 * size))
+        self.size = size
+        self.count = 0
+        self.total = 0
+
+    def add(self, seconds):
+        self.samples[self.count % self.size] = seconds
+        self.count += 1
+        self.total += seconds
+
+    def values(self):
+        n = min(self.count, self.size)
+        return self.samples[:n].tolist()
+
+    def percentiles(self, *ps):
+        """Перцентили ps (0..100) последних замеров методом ближайшего ранга, в секундах"""
+        ordered = sorted(self.values())
+        if not ordered:
+            return [None] * len(ps)
+        return [ordered[max(0, -(-len(ordered) * p // 100) - 1)] for p in ps]
+
+    def histogram(self):
+        counts = [0] * (len(HISTOGRAM_EDGES) + 1)
+        for seconds in self.values():
+            counts[bisect_right(HISTOGRAM_EDGES, seconds * 1000)] += 1
+        return counts
+
+class Profiler:
+    def __init__(self, size=RING_SIZE):
+        self.enabled = False
+        self.rings = {name: TimingRing(size) for name in PHASES}
+        self._watches = {}
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.rings[name].add(seconds)
+
+    def call(self, name, fn, *args):
+        """fn(*args), с замером времени в фазу name, если профилировщик включен"""
+        if not self.enabled:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.rings[name].add(time.perf_counter() - start)
+
+    def watch(self, obj, attr, name):
+        """Замерять вызовы obj.attr в фазу name.
+
+        Обертка ставится в атрибут экземпляра только на время включенного
+        профилировщика. Новый watch с тем же name заменяет прежний объект.
+        """
+        self._uninstall(name)
+        self._watches[name] = [obj, attr, False]
+        if self.enabled:
+            self._install(name)
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        for name in self._watches:
+            if enabled:
+                self._install(name)
+            else:
+                self._uninstall(name)
+
+    def toggle(self):
+        self.set_enabled(not self.enabled)
+
+    def summary(self):
+        """p50/p99/максимум по фазам в миллисекундах"""
+        result = {}
+        for name, ring in self.rings.items():
+            p50, p99, top = ring.percentiles(50, 99, 100)
+            result[name] = {
+                "count": ring.count,
+                "p50_ms": p50 * 1000 if p50 is not None else None,
+                "p99_ms": p99 * 1000 if p99 is not None else None,
+                "max_ms": top * 1000 if top is not None else None,
+            }
+        return result
+
+    def dump(self, path):
+        """Пишет сводку и гистограммы всех фаз в JSON"""
+        report = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "histogram_edges_ms": HISTOGRAM_EDGES,
+            "phases": self.summary(),
+        }
+        for name, ring in self.rings.items():
+            report["phases"][name]["histogram"] = ring.histogram()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    def _install(self, name):
+        watch = self._watches[name]
+        obj, attr, installed = watch
+        if installed:
+            return
+        fn = getattr(obj, attr)
+        ring = self.rings[name]
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                ring.add(perf_counter() - start)
+
+        setattr(obj, attr, timed)
+        watch[2] = True
+
+    def _uninstall(self, name):
+        watch = self._watches.get(name)
+        if watch is None or not watch[2]:
+            return
+        obj, attr, _ = watch
+        vars(obj).pop(attr, None)
+        watch[2] = False
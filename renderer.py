@@ -0,0 +1,485 @@
+# renderer.py
+from collections import namedtuple, deque
+from itertools import islice
+import os
+import time
+import pygame as pg
+
+# Размер клетки и отступы игрового поля на экране
+Layout = namedtuple("Layout", "cell_size margin_x margin_y")
+
+BACKGROUND = (30, 30, 30)
+APPLE_COLOR = (200, 10, 10)
+PATH_COLOR = (0, 255, 0, 128)
+# Начиная с этого сегмента цвет тела больше не зависит от номера
+GRADIENT_LENGTH = 34
+# Если за кадр змейка сделала больше ходов, дешевле перерисовать всё
+MAX_NEW_CELLS = 256
+
+_fonts = {}
+
+def get_font(size):
+    """Шрифт по умолчанию размера size, создается один раз.
+
+    Модуль шрифтов инициализируется только здесь, при первой надписи. Это тот
+    же шрифт, что SysFont(None), но без обхода всех шрифтов системы.
+    """
+    font = _fonts.get(size)
+    if font is None:
+        if not pg.font.get_init():
+            pg.font.init()
+        font = _fonts[size] = pg.font.Font(None, size)
+    return font
+
+def compute_layout(screen_width, screen_height, grid_width, grid_height):
+    """Размер клетки так, чтобы поле поместилось в экран с отступом, и центрирование"""
+    max_cell_width = (screen_width - 20) // grid_width
+    max_cell_height = (screen_height - 20) // grid_height
+    cell_size = min(max_cell_width, max_cell_height)
+
+    # Рассчитываем отступы для центрирования игры на экране
+    margin_x = (screen_width - cell_size * grid_width) // 2
+    margin_y = (screen_height - cell_size * grid_height) // 2
+    return Layout(cell_size, margin_x, margin_y)
+
+def segment_color(i):
+    """Цвет i-го сегмента от головы"""
+    return (0, max(100, 200 - i * 3), 0)
+
+def render_path_overlay(size, cycle_index, layout):
+    """Прозрачная поверхность с линией гамильтонова цикла, рисуется один раз на цикл"""
+    cell_size, margin_x, margin_y = layout
+    overlay = pg.Surface(size)
+    overlay.set_colorkey((0, 0, 0))
+    points = [(margin_x + x*cell_size + cell_size//2, margin_y + y*cell_size + cell_size//2)
+            for x, y in map(cycle_index.cell, range(len(cycle_index)))]
+    pg.draw.lines(overlay, PATH_COLOR, True, points, 2)
+    return overlay
+
+def draw_game(screen, game, layout, show_path=False, path_overlay=None, status=None):
+    """Полная перерисовка кадра для SnakeSimulator, status дописывается в строку отладки"""
+    cell_size, margin_x, margin_y = layout
+    cycle_index = game.cycle_index
+    snake = game.snake
+    apple = game.apple
+
+    screen.fill(BACKGROUND)
+
+    # Draw snake
+    for i, (x, y) in enumerate(snake):
+        pg.draw.rect(screen, segment_color(i),
+                    (margin_x + x*cell_size, margin_y + y*cell_size, cell_size-1, cell_size-1))
+
+    # Draw apple
+    if apple:
+        pg.draw.rect(screen, APPLE_COLOR,
+                    (margin_x + apple[0]*cell_size, margin_y + apple[1]*cell_size, cell_size-1, cell_size-1))
+
+    # Draw path if enabled
+    if show_path and cycle_index:
+        draw_path(screen, game, layout, path_overlay, status)
+
+def draw_path(screen, game, layout, path_overlay=None, status=None):
+    """Линия цикла, позиции сегментов на цикле и строка отладки поверх кадра"""
+    cell_size, margin_x, margin_y = layout
+    cycle_index = game.cycle_index
+    snake = game.snake
+    # Draw Hamiltonian cycle
+    if path_overlay is None:
+        path_overlay = render_path_overlay(screen.get_size(), cycle_index, layout)
+    screen.blit(path_overlay, (0, 0))
+
+    # Отображаем позиции всех сегментов змейки на цикле
+    for i, segment in enumerate(snake):
+        seg_cycle_pos = cycle_index.position(segment)
+        if seg_cycle_pos != -1:
+            seg_pos = cycle_index.cell(seg_cycle_pos)
+            r = min(255, int(255 * (1 - i / len(snake))))
+            b = min(255, int(255 * (i / len(snake))))
+            pg.draw.circle(screen, (r, 100, b),
+                        (margin_x + seg_pos[0]*cell_size + cell_size//2,
+                         margin_y + seg_pos[1]*cell_size + cell_size//2), 3)
+
+    # Отображение информации отладки
+    font = get_font(24)
+    info = f"Head: {game.head_cycle_position}, Tail: {game.tail_cycle_position}, Len: {len(snake)}"
+    if status:
+        info = f"{info}, {status}"
+    text = font.render(info, True, (255, 255, 255))
+    screen.blit(text, (margin_x + 10, margin_y + 10))
+
+class DirtyRenderer:
+    """Перерисовывает только изменившиеся клетки.
+
+    За тик меняются голова, ушедший хвост, яблоко и первые GRADIENT_LENGTH
+    сегментов (их цвет зависит от номера). draw() возвращает список
+    прямоугольников для pg.display.update или None, если кадр перерисован целиком
+    и нужен pg.display.flip. С включенным путем кадр всегда рисуется целиком
+    (там подписи у всех сегментов), но линия цикла берется из готовой поверхности.
+    """
+
+    def __init__(self, screen, layout):
+        self.screen = screen
+        self.layout = layout
+        self.pixels_touched = 0
+        self._path_overlay = None
+        self._path_index = None
+        self.invalidate()
+
+    def invalidate(self):
+        """Следующий кадр будет нарисован целиком"""
+        self._body = None
+        self._moves = 0
+        self._apple = None
+        self._resets = None
+        self._cycle_index = None
+        self._overlay_rect = None
+
+    def path_overlay(self, cycle_index):
+        if self._path_index is not cycle_index:
+            self._path_overlay = render_path_overlay(self.screen.get_size(), cycle_index, self.layout)
+            self._path_index = cycle_index
+        return self._path_overlay
+
+    def draw(self, game, show_path=False, status=None, overlay=None):
+        """overlay - (поверхность, позиция), рисуется поверх кадра (например, HUD)"""
+        rects = self._draw(game, show_path, status)
+        # Место под прошлым overlay уже перерисовано, новый кладем сверху
+        self._overlay_rect = None
+        if overlay is not None:
+            surface, pos = overlay
+            self._overlay_rect = self.screen.blit(surface, pos)
+            if rects is not None:
+                rects.append(self._overlay_rect)
+        return rects
+
+    def _draw(self, game, show_path, status):
+        snake = game.snake
+        if (show_path or self._body is None or self._resets != game.resets
+                or self._cycle_index is not game.cycle_index):
+            return self._full_redraw(game, show_path, status)
+
+        # Сколько ходов сделано с прошлого кадра - столько новых клеток у головы
+        moved = game.moves - self._moves
+        if moved > MAX_NEW_CELLS or moved >= len(snake) or snake[moved] != self._body[0]:
+            return self._full_redraw(game, show_path, status)
+        new_cells = list(islice(snake, moved))
+        self._moves = game.moves
+
+        dirty = set(new_cells)
+        body = self._body
+        body.extendleft(reversed(new_cells))
+        while len(body) > len(snake):
+            dirty.add(body.pop())
+
+        # Цвета первых сегментов сдвигаются на столько, сколько ходов сделано за кадр
+        gradient = {pos: i for i, pos in enumerate(islice(snake, GRADIENT_LENGTH + len(new_cells)))}
+        if new_cells:
+            dirty.update(gradient)
+
+        apple = game.apple
+        if apple != self._apple:
+            if self._apple:
+                dirty.add(self._apple)
+            if apple:
+                dirty.add(apple)
+            self._apple = apple
+
+        # Под прошлым overlay стираем фон и восстанавливаем клетки
+        rects = []
+        if self._overlay_rect is not None:
+            self.screen.fill(BACKGROUND, self._overlay_rect)
+            rects.append(self._overlay_rect)
+            dirty.update(self._cells_under(self._overlay_rect, game.width, game.height))
+        return self._draw_cells(dirty, gradient, snake, apple, rects)
+
+    def _cells_under(self, rect, grid_width, grid_height):
+        """Клетки поля, которые задевает прямоугольник экрана"""
+        cell_size, margin_x, margin_y = self.layout
+        x0 = max(0, (rect.left - margin_x) // cell_size)
+        y0 = max(0, (rect.top - margin_y) // cell_size)
+        x1 = min(grid_width - 1, (rect.right - 1 - margin_x) // cell_size)
+        y1 = min(grid_height - 1, (rect.bottom - 1 - margin_y) // cell_size)
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def _draw_cells(self, cells, gradient, snake, apple, rects):
+        cell_size, margin_x, margin_y = self.layout
+        screen = self.screen
+        for pos in cells:
+            x = margin_x + pos[0]*cell_size
+            y = margin_y + pos[1]*cell_size
+            rect = pg.Rect(x, y, cell_size, cell_size)
+            screen.fill(BACKGROUND, rect)
+            if pos == apple:
+                screen.fill(APPLE_COLOR, (x, y, cell_size-1, cell_size-1))
+            elif pos in gradient:
+                screen.fill(segment_color(gradient[pos]), (x, y, cell_size-1, cell_size-1))
+            elif pos in snake:
+                screen.fill(segment_color(GRADIENT_LENGTH), (x, y, cell_size-1, cell_size-1))
+            rects.append(rect)
+        self.pixels_touched = sum(rect.w * rect.h for rect in rects)
+        return rects
+
+    def _full_redraw(self, game, show_path, status=None):
+        overlay = self.path_overlay(game.cycle_index) if show_path else None
+        draw_game(self.screen, game, self.layout, show_path, overlay, status)
+        self._body = deque(game.snake)
+        self._moves = game.moves
+        self._apple = game.apple
+        self._resets = game.resets
+        self._cycle_index = game.cycle_index
+        # После кадра с путем следующий тоже должен стереть подписи целиком
+        if show_path:
+            self._body = None
+        width, height = self.screen.get_size()
+        self.pixels_touched = width * height
+        return None
+
+class FramebufferRenderer:
+    """Отрисовка через NumPy для очень больших полей.
+
+    Цвет каждой клетки хранится в массиве width x height (уже в формате
+    пикселя экрана) и обновляется по ходам змейки: новые клетки у головы,
+    ушедший хвост, яблоко и первые GRADIENT_LENGTH сегментов. Пиксели поля
+    видны через pygame.surfarray.pixels2d как массив клеток cell_size x cell_size,
+    так что кадр целиком - одно растяжение массива цветов (зазор в пиксель справа
+    и снизу не трогается и остается цветом фона), а за ход - одно присваивание
+    по изменившимся клеткам. Время кадра не зависит от длины змейки.
+    Интерфейс тот же, что у DirtyRenderer; numpy импортируется при создании.
+    """
+
+    def __init__(self, screen, layout):
+        import numpy as np
+        self.np = np
+        self.screen = screen
+        self.layout = layout
+        self.pixels_touched = 0
+        # С включенным путем кадр рисует DirtyRenderer: подписи у всех сегментов поштучные
+        self._path = DirtyRenderer(screen, layout)
+        self._grid = None
+        self.invalidate()
+
+    def invalidate(self):
+        """Следующий кадр будет нарисован целиком"""
+        self._body = None
+        self._moves = 0
+        self._apple = None
+        self._resets = None
+        self._overlay_rect = None
+        self._path.invalidate()
+
+    def _resize(self, width, height):
+        """Массивы и поверхность под поле width x height"""
+        np = self.np
+        cell_size, margin_x, margin_y = self.layout
+        self._grid = (width, height)
+        self._field = pg.Rect(margin_x, margin_y, width * cell_size, height * cell_size)
+        # pixels2d умеет только 8/16/32 бита на пиксель; для остальных экранов
+        # рисуем в свою 32-битную поверхность и копируем её на экран
+        if self.screen.get_bytesize() == 4:
+            self._target = self.screen.subsurface(self._field)
+            self._own_target = False
+        else:
+            self._target = pg.Surface(self._field.size, 0, 32)
+            self._target.fill(BACKGROUND)
+            self._own_target = True
+        target = self._target
+        self._background = target.map_rgb(BACKGROUND)
+        self._apple_color = target.map_rgb(APPLE_COLOR)
+        # Цвет i-го сегмента, последний - для всех сегментов дальше градиента
+        self._palette = np.array([target.map_rgb(segment_color(i)) for i in range(GRADIENT_LENGTH + 1)],
+                                 dtype=np.uint32)
+        self._colors = np.full((width, height), self._background, dtype=np.uint32)
+
+    def draw(self, game, show_path=False, status=None, overlay=None):
+        """overlay - (поверхность, позиция), рисуется поверх кадра (например, HUD)"""
+        if show_path:
+            self._body = None
+            self._overlay_rect = None
+            return self._path.draw(game, show_path, status, overlay)
+        self._path.invalidate()
+        if self._grid != (game.width, game.height):
+            self._resize(game.width, game.height)
+
+        changed = self._update_colors(game)
+        if changed is None:
+            rects = self._draw_full()
+        else:
+            rects = self._draw_cells(changed)
+        self._overlay_rect = None
+        if overlay is not None:
+            surface, pos = overlay
+            self._overlay_rect = self.screen.blit(surface, pos)
+            if rects is not None:
+                rects.append(self._overlay_rect)
+        if rects is None:
+            width, height = self.screen.get_size()
+            self.pixels_touched = width * height
+        else:
+            self.pixels_touched = sum(rect.w * rect.h for rect in rects)
+        return rects
+
+    def _cells_view(self):
+        """Пиксели поля как массив [x, пиксель по x, y, пиксель по y], пока жив - поверхность заблокирована"""
+        cell_size = self.layout.cell_size
+        width, height = self._grid
+        return pg.surfarray.pixels2d(self._target).reshape(width, cell_size, height, cell_size)
+
+    def _draw_full(self):
+        self.screen.fill(BACKGROUND)
+        if self._own_target:
+            self._target.fill(BACKGROUND)
+        inner = self.layout.cell_size - 1
+        cells = self._cells_view()
+        cells[:, :inner, :, :inner] = self._colors[:, None, :, None]
+        del cells
+        if self._own_target:
+            self.screen.blit(self._target, self._field)
+        return None
+
+    def _draw_cells(self, changed):
+        """Перерисовывает изменившиеся клетки и место под прошлым overlay"""
+        cell_size, margin_x, margin_y = self.layout
+        inner = cell_size - 1
+        rects = []
+        restore = self._overlay_rect
+        if restore is not None:
+            self.screen.fill(BACKGROUND, restore)
+            rects.append(restore)
+        if changed or (restore is not None and not self._own_target):
+            cells = self._cells_view()
+            if changed:
+                xs, ys = zip(*changed)
+                cells[xs, :inner, ys, :inner] = self._colors[xs, ys][:, None, None]
+            if restore is not None and not self._own_target:
+                # Клетки, которые задевает прошлый overlay (зазоры уже залиты фоном)
+                x0, y0, x1, y1 = self._cell_span(restore)
+                cells[x0:x1, :inner, y0:y1, :inner] = self._colors[x0:x1, None, y0:y1, None]
+            del cells
+        for x, y in changed:
+            rects.append(pg.Rect(margin_x + x*cell_size, margin_y + y*cell_size, cell_size, cell_size))
+        if self._own_target:
+            for rect in rects:
+                area = rect.clip(self._field)
+                if area:
+                    self.screen.blit(self._target, area, area.move(-margin_x, -margin_y))
+        return rects
+
+    def _cell_span(self, rect):
+        """Диапазон клеток [x0, x1) x [y0, y1), которые задевает прямоугольник экрана"""
+        cell_size, margin_x, margin_y = self.layout
+        width, height = self._grid
+        x0 = min(width, max(0, (rect.left - margin_x) // cell_size))
+        y0 = min(height, max(0, (rect.top - margin_y) // cell_size))
+        x1 = min(width, max(0, (rect.right - 1 - margin_x) // cell_size + 1))
+        y1 = min(height, max(0, (rect.bottom - 1 - margin_y) // cell_size + 1))
+        return x0, y0, x1, y1
+
+    def _update_colors(self, game):
+        """Обновляет массив цветов. Возвращает изменившиеся клетки или None, если он заполнен заново"""
+        snake = game.snake
+        moved = game.moves - self._moves
+        if (self._body is None or self._resets != game.resets or moved > MAX_NEW_CELLS
+                or moved >= len(snake) or snake[moved] != self._body[0]):
+            self._fill_colors(game)
+            return None
+        apple = game.apple
+        if not moved and apple == self._apple:
+            return []
+
+        new_cells = list(islice(snake, moved))
+        self._moves = game.moves
+        body = self._body
+        body.extendleft(reversed(new_cells))
+        cleared = []
+        while len(body) > len(snake):
+            cleared.append(body.pop())
+        if apple != self._apple:
+            if self._apple and self._apple not in snake:
+                cleared.append(self._apple)
+            self._apple = apple
+        self._paint(cleared, self._background)
+
+        # Цвета первых сегментов сдвигаются на столько, сколько ходов сделано за кадр
+        count = min(len(snake), GRADIENT_LENGTH + moved)
+        gradient = list(islice(snake, count))
+        self._paint(gradient, self._palette[self.np.minimum(self.np.arange(count), GRADIENT_LENGTH)])
+        changed = cleared + gradient
+        if apple:
+            self._paint([apple], self._apple_color)
+            changed.append(apple)
+        return changed
+
+    def _paint(self, cells, colors):
+        if cells:
+            xs, ys = zip(*cells)
+            self._colors[xs, ys] = colors
+
+    def _fill_colors(self, game):
+        """Весь массив заново по карте занятости поля"""
+        np = self.np
+        snake = game.snake
+        occupied = np.frombuffer(snake.occupied, dtype=np.uint8).reshape(self._grid)
+        colors = self._colors
+        colors[:] = self._background
+        colors[occupied.view(bool)] = self._palette[GRADIENT_LENGTH]
+        count = min(len(snake), GRADIENT_LENGTH)
+        self._paint(list(islice(snake, count)), self._palette[:count])
+        if game.apple:
+            self._paint([game.apple], self._apple_color)
+        self._body = deque(snake)
+        self._moves = game.moves
+        self._apple = game.apple
+        self._resets = game.resets
+
+RENDERERS = {
+    "dirty": DirtyRenderer,
+    "numpy": FramebufferRenderer,
+}
+
+def select_renderer(screen, layout, name=None):
+    """Отрисовщик по имени или из переменной SNAKE_RENDERER, по умолчанию DirtyRenderer.
+
+    Если для numpy-отрисовки не хватает numpy, остается DirtyRenderer.
+    """
+    name = name or os.environ.get("SNAKE_RENDERER") or "dirty"
+    try:
+        renderer_class = RENDERERS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный отрисовщик {name}, есть: {', '.join(RENDERERS)}")
+    try:
+        return renderer_class(screen, layout)
+    except ImportError as e:
+        print(f"Отрисовщик {name} недоступен ({e}), используем dirty")
+        return DirtyRenderer(screen, layout)
+
+class ProfilerHud:
+    """Поверхность с p50/p99 фаз профилировщика, перерисовывается не чаще interval секунд"""
+
+    def __init__(self, profiler, interval=0.5):
+        self.profiler = profiler
+        self.interval = interval
+        self._surface = None
+        self._rendered_at = 0
+
+    def surface(self, ticks_per_second, frames_per_second):
+        now = time.perf_counter()
+        if self._surface is not None and now - self._rendered_at < self.interval:
+            return self._surface
+
+        font = get_font(20)
+        lines = [f"TPS {ticks_per_second:.0f}  FPS {frames_per_second:.0f}", "phase  p50  p99 ms"]
+        for name, stats in self.profiler.summary().items():
+            if stats["count"]:
+                lines.append(f"{name}  {stats['p50_ms']:.3f}  {stats['p99_ms']:.3f}")
+        texts = [font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(text.get_width() for text in texts) + 8
+        height = sum(text.get_height() for text in texts) + 8
+        self._surface = pg.Surface((width, height))
+        self._surface.fill((0, 0, 0))
+        y = 4
+        for text in texts:
+            self._surface.blit(text, (4, y))
+            y += text.get_height()
+        self._rendered_at = now
+        return self._surface
@@ -0,0 +1,395 @@
+# replay.py
+"""Запись игр змейки и их проигрывание без pygame.
+
+Запуск: python replay.py replays/replay_....bin [--stop-at TICK] [--verify]
+
+Формат файла (все числа little-endian):
+  HEADER (магия, версия, длина настроек), настройки в JSON (размер поля, seed,
+  режимы ИИ и константы симулятора), цикл: первая клетка uint32 и направления
+  шагов по циклу по 2 бита на шаг.
+  Дальше блоки: CHUNK (тиков, яблок, флаги), яблоки парами uint32 (тик
+  появления, клетка), направления ходов по 2 бита на тик. Последний блок
+  помечен флагом CHUNK_END, а если игра кончилась столкновением - еще и
+  CHUNK_CRASHED.
+
+Яблоко записывается только в момент появления, поэтому запись не зависит от
+генератора случайных чисел: play() двигает змейку по записанным направлениям
+и сам находит тик столкновения. verify() дополнительно гоняет SnakeSimulator
+с тем же seed и находит первый тик, где текущий код ИИ расходится с записью.
+"""
+import json
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+from hamiltonial import HamiltonianCycle
+from planner import LOOKAHEAD_MARGIN
+from simulator import SnakeSimulator, start_snake_cells
+
+MAGIC = b"SRPL"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+CHUNK = struct.Struct("<IHB")
+CHUNK_END = 1
+CHUNK_CRASHED = 2
+# Тиков в одном блоке, кратно 4, чтобы блок заканчивался на целом байте
+CHUNK_TICKS = 4096
+
+# Код направления - 2 бита
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+CODES = {d: code for code, d in enumerate(DIRECTIONS)}
+
+# Прочитанная запись: apples - список (тик появления, клетка), codes - bytes с
+# кодом направления на каждый тик, crashed - игра кончилась столкновением
+Replay = namedtuple("Replay", "info cycle_cells apples codes crashed")
+# Итог проигрывания: сколько тиков сыграно, тик столкновения, первый тик, где
+# яблоко не совпало с записью, длина змейки в конце
+Playback = namedtuple("Playback", "ticks collision mismatch length")
+
+def pack_codes(codes):
+    """Коды 0..3 по четыре в байт, первый код в младших битах"""
+    packed = bytearray((len(codes) + 3) // 4)
+    for i, code in enumerate(codes):
+        packed[i >> 2] |= code << ((i & 3) * 2)
+    return packed
+
+# Байт -> его четыре кода, чтобы распаковка шла таблицей, а не по битам
+_UNPACKED = [bytes((byte >> shift) & 3 for shift in (0, 2, 4, 6)) for byte in range(256)]
+
+def unpack_codes(data, count):
+    """Обратное к pack_codes: bytes с count кодами"""
+    return b"".join(map(_UNPACKED.__getitem__, data))[:count]
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+class ReplayRecorder:
+    """Пишет игру в файл по мере того, как она идет.
+
+    Подключается к только что начатой игре и сам ставит себя в game.recorder.
+    Симулятор вызывает tick() на каждом ходе и apple() при появлении яблока,
+    а при столкновении или новой игре закрывает запись через close().
+    """
+
+    def __init__(self, path, game, settings=None):
+        if game.moves:
+            raise ValueError("Запись можно начать только в начале игры")
+        self.path = path
+        self.height = game.height
+        self.ticks = 0
+        self.closed = False
+        self._chunk_ticks = 0
+        self._apples = array("I")
+        self._dirs = bytearray()
+        self._byte = 0
+        self._shift = 0
+
+        info = {
+            "width": game.width,
+            "height": game.height,
+            "seed": game.seed,
+            "auto_mode": game.auto_mode,
+            "acceleration_mode": game.acceleration_mode,
+            "planner": game.planner,
+            "repair": game.repair,
+            "apple_growth": game.apple_growth,
+            "min_distance": game.min_distance,
+            "lookahead_margin": LOOKAHEAD_MARGIN,
+            "settings": settings or {},
+        }
+        blob = json.dumps(info).encode()
+        # Цикл - это тоже путь по соседним клеткам, 2 бита на шаг
+        cells = game.cycle_index.cell_at
+        step_codes = {self.height: 0, 1: 1, -self.height: 2, -1: 3}
+        steps = [step_codes[b - a] for a, b in zip(cells, cells[1:])]
+
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, len(blob)))
+        self._file.write(blob)
+        self._file.write(struct.pack("<I", cells[0]))
+        self._file.write(pack_codes(steps))
+
+        if game.apple:
+            self.apple(game.apple)
+        game.recorder = self
+
+    def tick(self, direction):
+        """Ход змейки в направлении direction"""
+        self._byte |= CODES[direction] << self._shift
+        self._shift += 2
+        if self._shift == 8:
+            self._dirs.append(self._byte)
+            self._byte = 0
+            self._shift = 0
+        self.ticks += 1
+        self._chunk_ticks += 1
+        if self._chunk_ticks == CHUNK_TICKS:
+            self._flush(0)
+
+    def apple(self, pos):
+        """Яблоко появилось в клетке pos после текущего тика"""
+        self._apples.append(self.ticks)
+        self._apples.append(pos[1] + self.height * pos[0])
+
+    def close(self, crashed=False):
+        """Дописывает последний блок. Повторный вызов ничего не делает"""
+        if self.closed:
+            return
+        if self._shift:
+            self._dirs.append(self._byte)
+        self._flush(CHUNK_END | (CHUNK_CRASHED if crashed else 0))
+        self._file.close()
+        self.closed = True
+
+    def _flush(self, flags):
+        f = self._file
+        f.write(CHUNK.pack(self._chunk_ticks, len(self._apples) // 2, flags))
+        f.write(_little_endian(self._apples))
+        f.write(self._dirs)
+        # Блок уходит в ОС сразу, чтобы запись пережила падение процесса
+        f.flush()
+        self._chunk_ticks = 0
+        self._apples = array("I")
+        self._dirs = bytearray()
+
+def load_replay(path):
+    """Читает запись. Оборванный файл читается до последнего целого блока"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, blob_size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: не файл записи или другая версия")
+    offset = HEADER.size
+    info = json.loads(data[offset:offset + blob_size])
+    offset += blob_size
+
+    width, height = info["width"], info["height"]
+    size = width * height
+    (cell,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    packed = (size - 1 + 3) // 4
+    deltas = (height, 1, -height, -1)
+    cycle_cells = [cell]
+    for code in unpack_codes(data[offset:offset + packed], size - 1):
+        cell += deltas[code]
+        cycle_cells.append(cell)
+    offset += packed
+
+    apples = []
+    codes = []
+    crashed = False
+    while offset + CHUNK.size <= len(data):
+        ticks, apple_count, flags = CHUNK.unpack_from(data, offset)
+        start = offset + CHUNK.size
+        end = start + apple_count * 8 + (ticks + 3) // 4
+        if end > len(data):
+            break
+        pairs = array("I", data[start:start + apple_count * 8])
+        if sys.byteorder != "little":
+            pairs.byteswap()
+        apples.extend(zip(pairs[::2], pairs[1::2]))
+        codes.append(unpack_codes(data[start + apple_count * 8:end], ticks))
+        offset = end
+        if flags & CHUNK_END:
+            crashed = bool(flags & CHUNK_CRASHED)
+            break
+    return Replay(info, cycle_cells, apples, b"".join(codes), crashed)
+
+def play(replay, stop_at=None):
+    """Проигрывает запись по направлениям, без симулятора и ИИ.
+
+    Останавливается на первом столкновении (выход за поле или в тело), на
+    первом яблоке, которое не совпало с записью, или на тике stop_at.
+    """
+    import numpy as np
+
+    info = replay.info
+    width, height = info["width"], info["height"]
+    codes = np.frombuffer(replay.codes, dtype=np.uint8)
+    if stop_at is not None:
+        codes = codes[:stop_at]
+
+    # Траектория головы целиком: начальное тело от хвоста к голове, потом ходы.
+    # Голова после тика t - это cells[first + t]
+    start = start_snake_cells(width, height)[::-1]
+    first = len(start) - 1
+    dx = np.array([d[0] for d in DIRECTIONS], dtype=np.int64)[codes]
+    dy = np.array([d[1] for d in DIRECTIONS], dtype=np.int64)[codes]
+    xs = np.concatenate(([p[0] for p in start], start[-1][0] + np.cumsum(dx)))
+    ys = np.concatenate(([p[1] for p in start], start[-1][1] + np.cumsum(dy)))
+
+    collision = None
+    outside = np.flatnonzero((xs < 0) | (xs >= width) | (ys < 0) | (ys >= height))
+    if len(outside):
+        collision = int(outside[0]) - first
+        xs, ys = xs[:outside[0]], ys[:outside[0]]
+    cells = ys + height * xs
+    played = len(cells) - 1 - first
+
+    # Яблоко съедается на тике, когда появляется следующее: голова должна
+    # прийти в его клетку именно тогда, а не раньше
+    mismatch = None
+    eaten = []
+    apples = replay.apples
+    for i, (spawn, cell) in enumerate(apples):
+        if spawn >= played:
+            break
+        eat = apples[i + 1][0] if i + 1 < len(apples) else None
+        last = played if eat is None else min(eat, played)
+        hits = np.flatnonzero(cells[first + spawn + 1:first + last + 1] == cell)
+        hit = spawn + 1 + int(hits[0]) if len(hits) else None
+        if hit is None:
+            if eat is not None and eat <= played:
+                mismatch = eat
+            break
+        if eat is not None and hit != eat:
+            mismatch = hit
+            break
+        eaten.append(hit)
+
+    # Тики, на которых хвост не снимается: съедение и следующие, пока есть рост
+    no_pop = np.zeros(played + 2, dtype=np.int64)
+    add_count = 0
+    prev = 0
+    for eat in eaten + [None]:
+        end = played if eat is None else eat - 1
+        span = min(add_count, end - prev)
+        no_pop[prev + 1] += 1
+        no_pop[prev + 1 + span] -= 1
+        add_count -= span
+        if eat is None:
+            break
+        no_pop[eat] += 1
+        no_pop[eat + 1] -= 1
+        add_count += info["apple_growth"]
+        prev = eat
+    # Длина змейки после тика t, t = 0..played
+    length = len(start) + np.cumsum(np.cumsum(no_pop)[:played + 1])
+
+    # Столкновение с телом: перед тиком t тело - это последние length[t - 1]
+    # положений головы, и клетка новой головы встречалась среди них
+    order = np.lexsort((np.arange(len(cells)), cells))
+    previous = np.full(len(cells), -len(cells) - 1, dtype=np.int64)
+    same = cells[order[1:]] == cells[order[:-1]]
+    previous[order[1:][same]] = order[:-1][same]
+    heads = np.arange(first + 1, first + 1 + played)
+    hits = np.flatnonzero(previous[heads] >= heads - length[:played])
+    if len(hits):
+        collision = int(hits[0]) + 1
+
+    # Запись кончилась столкновением, а проигрыватель его не нашел
+    if (replay.crashed and stop_at is None and collision is None and mismatch is None
+            and len(codes) == len(replay.codes)):
+        mismatch = len(codes)
+
+    if collision is not None and mismatch is not None:
+        if collision <= mismatch:
+            mismatch = None
+        else:
+            collision = None
+    stop = collision if collision is not None else mismatch
+    if stop is not None:
+        played = stop - 1
+    return Playback(played, collision, mismatch, int(length[played]))
+
+class _Capture:
+    """Подставляется в game.recorder, чтобы verify() видел ходы и яблоки симулятора"""
+
+    def __init__(self):
+        self.direction = None
+        self.spawned = None
+        self.crashed = False
+
+    def tick(self, direction):
+        self.direction = direction
+
+    def apple(self, pos):
+        self.spawned = pos
+
+    def close(self, crashed=False):
+        self.crashed = crashed
+
+def verify(replay, stop_at=None):
+    """Первый тик, на котором SnakeSimulator с тем же seed ходит не так, как в записи.
+
+    None, если текущий код повторил запись до конца (включая столкновение).
+    В ручном режиме направления берутся из записи, сверяются только яблоки.
+    """
+    info = replay.info
+    width, height = info["width"], info["height"]
+    hamilton = HamiltonianCycle.from_cells(width // 2, height // 2, replay.cycle_cells)
+    game = SnakeSimulator(hamilton, seed=info["seed"], auto_mode=info["auto_mode"],
+                          acceleration_mode=info["acceleration_mode"], planner=info["planner"],
+                          repair=info.get("repair", False),
+                          min_distance=info["min_distance"], apple_growth=info["apple_growth"])
+    apples = dict(replay.apples)
+    if game.apple is None or apples.get(0) != game.apple[1] + height * game.apple[0]:
+        return 0
+
+    capture = _Capture()
+    game.recorder = capture
+    codes = replay.codes
+    total = len(codes) if stop_at is None else min(stop_at, len(codes))
+    for tick in range(1, total + 1):
+        if not game.auto_mode:
+            game.turn(DIRECTIONS[codes[tick - 1]])
+        capture.spawned = None
+        alive = game.step()
+        if CODES[capture.direction] != codes[tick - 1]:
+            return tick
+        if not alive:
+            # Разбились: это совпадение, только если запись тоже кончилась здесь
+            return None if tick == len(codes) and replay.crashed else tick
+        spawned = capture.spawned
+        if (spawned is None) != (tick not in apples):
+            return tick
+        if spawned is not None and apples[tick] != spawned[1] + height * spawned[0]:
+            return tick
+    if total == len(codes) and replay.crashed:
+        return total
+    return None
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Проигрывание записи игры змейки")
+    parser.add_argument("path")
+    parser.add_argument("--stop-at", type=int, default=None, help="остановиться на этом тике")
+    parser.add_argument("--verify", action="store_true",
+                        help="сверить запись с текущим кодом ИИ")
+    args = parser.parse_args()
+
+    replay = load_replay(args.path)
+    info = replay.info
+    print(f"Поле {info['width']}x{info['height']}, seed {info['seed']}, "
+          f"тиков {len(replay.codes)}, яблок {len(replay.apples)}, "
+          f"{'столкновение' if replay.crashed else 'без столкновения'}")
+
+    # numpy грузим заранее, чтобы не мерить время его импорта
+    import numpy  # noqa: F401
+    start = time.perf_counter()
+    result = play(replay, args.stop_at)
+    elapsed = time.perf_counter() - start
+    print(f"Сыграно {result.ticks} тиков за {elapsed:.3f} с "
+          f"({result.ticks / elapsed if elapsed else 0:.0f} тиков/с), длина {result.length}")
+    if result.collision is not None:
+        print(f"Столкновение на тике {result.collision}")
+    if result.mismatch is not None:
+        print(f"Яблоко не совпало с записью на тике {result.mismatch}")
+
+    if args.verify:
+        tick = verify(replay, args.stop_at)
+        if tick is None:
+            print("Текущий код повторяет запись")
+        else:
+            print(f"Расхождение с текущим кодом на тике {tick}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
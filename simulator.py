@@ -0,0 +1,555 @@
+# simulator.py
+import random
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import partial
+from operator import attrgetter
+from board import SnakeBoard
+from hamiltonial import HamiltonianCycle
+from planner import plan_path, LOOKAHEAD_MARGIN
+from mutation import CycleMutator, body_in_order, position_after, validate_cycle
+
+# Минимальная дистанция по циклу между головой и хвостом для срезки пути
+MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL = 50
+# Сколько сегментов добавляет одно яблоко
+APPLE_GROWTH = 4
+# Стратегии срезок: жадный выбор соседа или путь на несколько ходов вперед
+PLANNERS = ("greedy", "lookahead")
+# Перестройка цикла к новому яблоку: не больше стольких замен ребер,
+# новые ребра ищутся в блоках на таком расстоянии от головы и от яблока
+REPAIR_ROUNDS = 4
+REPAIR_RADIUS = 1
+# Стратегии, с которыми перестройка включается. С жадной она удлиняет игры на
+# больших полях (40x30: 59615 -> 62265 ходов) и добавляет столкновения в конце игры
+REPAIR_PLANNERS = ("lookahead",)
+# Поля SnakeSimulator, которые запоминает snapshot() (тело змейки хранит журнал поля)
+SNAPSHOT_FIELDS = ("_direction", "_add_count", "_apple", "_head_cycle_position", "_moves",
+                   "_apples_eaten", "_shortcuts", "_plan", "_plan_step", "_plan_head",
+                   "_plan_apple", "_body_ordered", "crashes", "resets")
+
+# Точка отката: отметка в журнале поля и значения SNAPSHOT_FIELDS
+Snapshot = namedtuple("Snapshot", "mark state")
+
+def start_snake_cells(grid_width, grid_height):
+    """Начальное положение змейки: три клетки в центре, от головы к хвосту"""
+    return [(grid_width//2 - i, grid_height//2) for i in range(3)]
+
+_snapshot_state = attrgetter(*SNAPSHOT_FIELDS)
+
+class SnakeSimulator:
+    """Логика игры змейки без pygame и без привязки ко времени.
+
+    Один вызов step() - один тик змейки. Состояние доступно только для чтения
+    через свойства, менять его можно только через step(), turn() и reset().
+    """
+
+    def __init__(self, hamilton, seed=None, auto_mode=True, acceleration_mode=True, planner="greedy",
+                 repair=False, min_distance=MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL, apple_growth=APPLE_GROWTH):
+        if planner not in PLANNERS:
+            raise ValueError(f"Неизвестная стратегия срезок {planner}")
+        if min_distance < 0:
+            raise ValueError(f"Запас до хвоста не может быть отрицательным: {min_distance}")
+        if apple_growth < 1:
+            raise ValueError(f"Яблоко должно добавлять хотя бы один сегмент, а не {apple_growth}")
+        self.hamilton = hamilton
+        self.cycle_index = hamilton.index
+        self.width = hamilton.full_w
+        self.height = hamilton.full_h
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.auto_mode = auto_mode
+        self.acceleration_mode = acceleration_mode
+        self.planner = planner
+        # С repair цикл под свободными клетками перестраивается к каждому новому яблоку,
+        # если стратегия срезок из REPAIR_PLANNERS
+        self.repair = repair
+        # Проверять цикл целиком (validate_cycle) и промежуток до хвоста после каждой
+        # перестройки к яблоку - O(n) на яблоко, ошибка перестройки поднимает ValueError
+        self.validate = True
+        # Запас до хвоста для срезок и рост за яблоко (tuning.py подбирает их под размер поля)
+        self.min_distance = min_distance
+        self.apple_growth = apple_growth
+        self.crashes = 0
+        self.resets = 0
+        # Запись игры (replay.ReplayRecorder), получает каждый ход и каждое яблоко
+        self.recorder = None
+        # Счетчики решений ИИ (telemetry.Telemetry), None - выключены
+        self.telemetry = None
+        # Перестройка цикла под змейкой (mutation.CycleMutator), создается при первом morph()
+        self._mutator = None
+        # Сколько снимков snapshot() еще не закрыто, отложенные на это время запись и телеметрия
+        self._snapshots = 0
+        self._held_recorder = None
+        self._held_telemetry = None
+        self._board = SnakeBoard(self.width, self.height)
+        self.reset()
+
+    def reset(self, hamilton=None, seed=None):
+        """Начинает игру заново на том же цикле или на новом цикле того же размера.
+
+        С seed генератор яблок начинается заново, и игра повторяет
+        SnakeSimulator(hamilton, seed) ход в ход.
+        """
+        if self._snapshots and (hamilton is not None or seed is not None):
+            raise ValueError("Нельзя сменить цикл или seed, пока открыт снимок")
+        if hamilton is not None:
+            if (hamilton.full_w, hamilton.full_h) != (self.width, self.height):
+                raise ValueError("Новый цикл другого размера")
+            self.hamilton = hamilton
+            self.cycle_index = hamilton.index
+            self._mutator = None
+        elif self._mutator is not None and self.cycle_index is not self.hamilton.index:
+            # После morph() или repair_cycle() cycle_index - CycleView поверх блоков, поиск
+            # в нем медленнее. Новая игра идет по тому же циклу, но с плоским CycleIndex:
+            # позиции клеток те же, следующий morph() начнет новый CycleMutator
+            self.hamilton = HamiltonianCycle.from_cells(self.hamilton.base_w, self.hamilton.base_h,
+                                                        self._mutator.cycle_cells())
+            self.cycle_index = self.hamilton.index
+            self._mutator = None
+        if seed is not None:
+            self.seed = seed
+            self.rng.seed(seed)
+        # Запись относится к одной игре
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.telemetry is not None:
+            self.telemetry.game_end(self, "reset")
+        self.resets += 1
+        self._board.reset(start_snake_cells(self.width, self.height))
+        self._direction = (1, 0)
+        self._add_count = 0
+        self._apple = None
+        self._head_cycle_position = self.cycle_index.position(self._board[0])
+        self._moves = 0
+        self._apples_eaten = 0
+        self._shortcuts = 0
+        # Путь планировщика: список позиций, _plan_step - следующая из них
+        self._plan = None
+        self._plan_step = 0
+        self._plan_head = None
+        self._plan_apple = None
+        # Тело уже идет по циклу по порядку (проверяет repair_cycle)
+        self._body_ordered = False
+        self.spawn_apple()
+        if self.telemetry is not None:
+            self.telemetry.game_start(self)
+
+    # Состояние только для чтения
+    @property
+    def snake(self):
+        return self._board
+
+    @property
+    def apple(self):
+        return self._apple
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @property
+    def add_count(self):
+        return self._add_count
+
+    @property
+    def head_cycle_position(self):
+        return self._head_cycle_position
+
+    @property
+    def tail_cycle_position(self):
+        return self.cycle_index.position(self._board[-1])
+
+    @property
+    def moves(self):
+        return self._moves
+
+    @property
+    def apples_eaten(self):
+        return self._apples_eaten
+
+    @property
+    def shortcuts(self):
+        """Сколько ходов срезали путь, а не шли по циклу"""
+        return self._shortcuts
+
+    @property
+    def completed(self):
+        """Змейка заняла всё поле"""
+        return not self._board.free
+
+    def turn(self, direction):
+        """Ручное управление: разворот назад игнорируется"""
+        if (direction[0] + self._direction[0], direction[1] + self._direction[1]) != (0, 0):
+            self._direction = direction
+
+    def spawn_apple(self):
+        if self._snapshots:
+            # Состояние генератора копируется долго, поэтому только перед его использованием
+            self._board.note(partial(self.rng.setstate, self.rng.getstate()))
+        free_cell = self._board.random_free(self.rng)
+        if free_cell:
+            self._apple = free_cell
+            if self.recorder is not None:
+                self.recorder.apple(free_cell)
+            # Первое яблоко игры ставится на цикл как есть, чтобы запись,
+            # начатая после reset(), хранила цикл, с которого игра пошла
+            if self.repair and self._moves and self.planner in REPAIR_PLANNERS:
+                self.repair_cycle()
+
+    def shortcut_limit(self, min_distance=None):
+        """Насколько далеко вперед по циклу голова может прыгнуть, не обгоняя хвост.
+
+        Срезка на позицию p разрешена, если distance(голова, p) < shortcut_limit().
+        0 значит, что срезки запрещены. min_distance - запас до хвоста, по
+        умолчанию self.min_distance.
+        """
+        index = self.cycle_index
+        head_pos = self._head_cycle_position
+        if min_distance is None:
+            min_distance = self.min_distance
+        margin = min_distance + self._add_count
+        actual_tail = index.position(self._board[-1])
+
+        if actual_tail == -1:
+            return 0
+
+        if index.distance(head_pos, actual_tail) <= margin:
+            return 0
+
+        return index.distance(head_pos, (actual_tail - margin) % index.length)
+
+    def limit_reason(self, min_distance=None):
+        """Почему shortcut_limit(min_distance) запрещает срезки, для телеметрии:
+        "limit_no_tail", "limit_tail_margin", "limit_growth_margin" или None"""
+        index = self.cycle_index
+        if min_distance is None:
+            min_distance = self.min_distance
+        actual_tail = index.position(self._board[-1])
+        if actual_tail == -1:
+            return "limit_no_tail"
+        distance = index.distance(self._head_cycle_position, actual_tail)
+        if distance <= min_distance:
+            return "limit_tail_margin"
+        if distance <= min_distance + self._add_count:
+            return "limit_growth_margin"
+        return None
+
+    def will_overtake_tail(self, new_pos_cycle):
+        """Обгонит ли голова хвост, если перейти на позицию new_pos_cycle"""
+        distance = self.cycle_index.distance(self._head_cycle_position, new_pos_cycle)
+        return distance >= self.shortcut_limit()
+
+    def get_next_position(self, head):
+        """Следующая клетка для головы: срезка к яблоку или шаг по циклу"""
+        index = self.cycle_index
+        self._head_cycle_position = head_pos = index.position(head)
+        telemetry = self.telemetry
+
+        if self.acceleration_mode:
+            min_distance = self.lookahead_distance() if self.planner == "lookahead" else None
+            limit = self.shortcut_limit(min_distance)
+            if limit > 0:
+                best = -1
+                if self.planner == "lookahead":
+                    best = self._planned_position(head_pos, limit)
+                    if best == -1 and telemetry is not None:
+                        telemetry.count("plan_miss")
+                if best == -1:
+                    best = self._greedy_position(head_pos, limit)
+
+                if best != -1:
+                    if best != (head_pos + 1) % index.length:
+                        self._shortcuts += 1
+                    elif telemetry is not None:
+                        telemetry.count("cycle_steps")
+                    return index.cell(best)
+            elif telemetry is not None:
+                telemetry.count(self.limit_reason(min_distance))
+
+        if telemetry is not None:
+            telemetry.count("cycle_steps")
+        return index.cell(index.next_position(head_pos))
+
+    def lookahead_distance(self):
+        """Запас до хвоста для планировщика, растет вместе с полем"""
+        return max(self.min_distance, int(self.cycle_index.length * LOOKAHEAD_MARGIN))
+
+    def _greedy_position(self, head_pos, limit):
+        """Сосед головы, ближайший к яблоку по циклу, или -1"""
+        index = self.cycle_index
+        length = index.length
+        apple_cycle_pos = index.position(self._apple) if self._apple else -1
+        min_dist = length
+        best = -1
+
+        # Тот же выбор, что и will_overtake_tail для каждого соседа,
+        # но граница по хвосту считается один раз за тик
+        for pos_idx in index.neighbor_positions(head_pos):
+            if (pos_idx - head_pos) % length >= limit:
+                if self.telemetry is not None:
+                    self.telemetry.count("neighbor_overtake")
+                continue
+
+            distance = (apple_cycle_pos - pos_idx) % length
+            if distance < min_dist:
+                min_dist = distance
+                best = pos_idx
+        return best
+
+    def _planned_position(self, head_pos, limit):
+        """Следующая позиция на пути к яблоку, или -1, если яблоко пока не достать"""
+        index = self.cycle_index
+        plan = self._plan
+        step = self._plan_step
+        # Путь годится, пока яблоко то же, голова идет по нему, а следующая
+        # клетка свободна и не ближе к хвосту, чем разрешено
+        if not (plan and step < len(plan) and self._plan_head == head_pos
+                and self._plan_apple == self._apple
+                and index.distance(head_pos, plan[step]) < limit
+                and not self._board.occupied[index.cell_at[plan[step]]]):
+            path = None
+            if self._apple:
+                path = plan_path(index, self._board.occupied, head_pos,
+                                 index.position(self._apple), limit)
+            if not path:
+                self._plan = None
+                return -1
+            # Список не меняется, поэтому снимок хранит его по ссылке
+            self._plan = plan = path
+            self._plan_step = step = 0
+            self._plan_apple = self._apple
+
+        self._plan_head = plan[step]
+        self._plan_step = step + 1
+        return self._plan_head
+
+    def morph(self, rng=None, attempts=8):
+        """Заменяет одно ребро остовного дерева под змейкой, не останавливая игру.
+
+        Пробует до attempts случайных замен, подходит первая, которую разрешает
+        flip_allowed(). Возвращает True, если цикл изменился. rng - random.Random,
+        по умолчанию модуль random: генератор яблок не трогаем, иначе игра
+        разойдется с записью и с seed.
+        """
+        if self._snapshots:
+            return False
+        if self._mutator is None:
+            self._mutator = CycleMutator(self.hamilton)
+        rng = rng if rng is not None else random
+        for _ in range(attempts):
+            flip = self._mutator.propose(rng)
+            if flip is not None and self.flip_allowed(flip):
+                # Случайные замены в записи не повторить, на них запись заканчивается
+                if self.recorder is not None:
+                    self.recorder.close()
+                    self.recorder = None
+                self.apply_flip(flip)
+                return True
+        return False
+
+    def repair_cycle(self, rounds=REPAIR_ROUNDS):
+        """Приближает яблоко к голове по циклу заменами ребер рядом с головой и яблоком.
+
+        Каждый раунд берет замену, разрешенную flip_allowed(), которая сильнее
+        всего сокращает путь до яблока по циклу. Выбор зависит только от
+        состояния игры, поэтому verify() повторяет его по записи.
+        Возвращает число сделанных замен.
+        """
+        if self._apple is None or self._snapshots:
+            return 0
+        # flip_allowed() опирается на порядок тела по циклу. В начале игры его нет:
+        # начальные клетки лежат поперек цикла, и срезки до того, как хвост их
+        # прошел, оставляют тело не по порядку. Сложившись, порядок сохраняется
+        # (срезки идут вперед и не дальше хвоста, замены его не меняют)
+        if not self._body_ordered:
+            if not body_in_order(self.cycle_index, self._board.body):
+                return 0
+            self._body_ordered = True
+        n = self.cycle_index.length
+        # Замены не меняют промежуток от головы до хвоста, но приближают яблоко,
+        # а съеденное яблоко добавит еще apple_growth сегментов: если промежуток
+        # не вмещает этот рост поверх запаса, голова упрется в хвост
+        gap = self.tail_gap()
+        if gap <= self.min_distance + self._add_count + self.apple_growth:
+            return 0
+        if self._mutator is None:
+            self._mutator = CycleMutator(self.hamilton)
+        mutator = self._mutator
+        height = self.height
+        done = 0
+        for _ in range(rounds):
+            index = self.cycle_index
+            head = index.position(self._board[0])
+            apple = index.position(self._apple)
+            best = None
+            best_distance = (apple - head) % n
+            nodes = set()
+            for cell in (self._board[0], self._apple):
+                node = mutator.node_of(cell[1] + height * cell[0])
+                nodes.update(mutator.nodes_around(node, REPAIR_RADIUS))
+            for flip in mutator.flips_near(sorted(nodes)):
+                distance = (position_after(flip, apple, n) - position_after(flip, head, n)) % n
+                if distance < best_distance and self.flip_allowed(flip):
+                    best, best_distance = flip, distance
+            if best is None:
+                break
+            self.apply_flip(best)
+            done += 1
+        if done and self.validate:
+            validate_cycle(self.cycle_index, self._board.body)
+            if self.tail_gap() != gap:
+                raise ValueError(f"Перестройка изменила промежуток до хвоста: {gap} -> {self.tail_gap()}")
+        return done
+
+    def tail_gap(self):
+        """Сколько ходов по циклу от головы до хвоста"""
+        index = self.cycle_index
+        return (index.position(self._board[-1]) - index.position(self._board[0])) % index.length
+
+    def flip_allowed(self, flip):
+        """Сохранит ли замена голову позади хвоста.
+
+        Тело должно остаться целиком по одну сторону от переносимого отрезка,
+        тогда порядок его клеток на цикле не меняется. Промежуток от головы до
+        хвоста при замене не растет, а если сжимается, его свободные клетки
+        оказываются дырами внутри тела, как после срезки. Дыры, которые
+        змейка не выбирала, мешают ей в конце игры, поэтому промежуток должен
+        остаться прежним.
+        """
+        index = self.cycle_index
+        n = index.length
+        head = index.position(self._board[0])
+        tail = index.position(self._board[-1])
+        body = (head - tail) % n
+        outside = (flip.start - tail) % n > body and (flip.start - tail) % n + flip.length <= n
+        inside = (tail - flip.start) % n + body < flip.length
+        if not (outside or inside):
+            return False
+        new_body = (position_after(flip, head, n) - position_after(flip, tail, n)) % n
+        return new_body == body
+
+    def apply_flip(self, flip):
+        """Применяет замену без проверок, см. flip_allowed()"""
+        self._mutator.apply(flip)
+        self.cycle_index = self._mutator.index
+        self._head_cycle_position = self.cycle_index.position(self._board[0])
+        self._plan = None
+
+    def snapshot(self):
+        """Точка отката для restore(), за O(1) от размера поля.
+
+        С первого открытого снимка поле ведет журнал отмены, так что память
+        растет с числом сделанных после снимка ходов. Пока снимок открыт, запись
+        игры отложена, а цикл не перестраивается (morph() и repair_cycle()
+        ничего не делают): отменять замены ребер не умеем. Снимок закрывается
+        release(), проще всего пользоваться fork().
+        """
+        if not self._snapshots:
+            self._held_recorder, self.recorder = self.recorder, None
+            self._held_telemetry, self.telemetry = self.telemetry, None
+        self._snapshots += 1
+        return Snapshot(self._board.begin(), _snapshot_state(self))
+
+    def restore(self, snapshot):
+        """Возвращает игру к снимку. Снимок остается открытым, к нему можно вернуться еще раз"""
+        if not self._snapshots:
+            raise ValueError("Снимок уже закрыт")
+        self._board.rollback(snapshot.mark)
+        for name, value in zip(SNAPSHOT_FIELDS, snapshot.state):
+            setattr(self, name, value)
+
+    def release(self, snapshot):
+        """Закрывает снимок, игра продолжается с текущего состояния.
+
+        Когда закрыт последний снимок, журнал поля выключается. Если игра
+        ушла от снимка, отложенная запись ей больше не соответствует и закрывается.
+        """
+        if not self._snapshots:
+            raise ValueError("Снимок уже закрыт")
+        self._snapshots -= 1
+        if self._snapshots:
+            return
+        diverged = len(self._board.log) > snapshot.mark
+        self._board.end()
+        self.telemetry, self._held_telemetry = self._held_telemetry, None
+        recorder, self._held_recorder = self._held_recorder, None
+        if recorder is not None and diverged:
+            recorder.close()
+            recorder = None
+        self.recorder = recorder
+
+    @contextmanager
+    def fork(self):
+        """with game.fork(): ... - пробные ходы внутри блока отменяются на выходе"""
+        snapshot = self.snapshot()
+        try:
+            yield self
+        finally:
+            self.restore(snapshot)
+            self.release(snapshot)
+
+    def step(self):
+        """Один тик. Возвращает False, если змейка разбилась и игра началась заново"""
+        board = self._board
+        head = board.body[0]
+
+        if self.auto_mode:
+            next_pos = self.get_next_position(head)
+            dx = next_pos[0] - head[0]
+            dy = next_pos[1] - head[1]
+            if dx != 0:
+                dx = 1 if dx > 0 else -1
+            if dy != 0:
+                dy = 1 if dy > 0 else -1
+            self.turn((dx, dy))
+
+        new_head = (head[0] + self._direction[0], head[1] + self._direction[1])
+        if self.recorder is not None:
+            self.recorder.tick(self._direction)
+
+        if (new_head[0] < 0 or new_head[0] >= self.width or
+            new_head[1] < 0 or new_head[1] >= self.height or
+            new_head in board):
+            self.crashes += 1
+            if self.recorder is not None:
+                self.recorder.close(crashed=True)
+                self.recorder = None
+            if self.telemetry is not None:
+                self.telemetry.game_end(self, "crash")
+            self.reset()
+            return False
+
+        board.push_head(new_head)
+        self._moves += 1
+
+        telemetry = self.telemetry
+        if new_head == self._apple:
+            self._add_count += self.apple_growth
+            self._apples_eaten += 1
+            if telemetry is not None:
+                telemetry.apple(self)
+            self.spawn_apple()
+        elif self._add_count <= 0:
+            board.pop_tail()
+        else:
+            self._add_count -= 1
+
+        if telemetry is not None:
+            telemetry.tick(self)
+            if not board.free:
+                telemetry.game_end(self, "completed")
+        return True
+
+    def run_until_complete(self, max_moves=None):
+        """Играет до заполнения поля.
+
+        Возвращает число ходов до победы или None, если змейка разбилась
+        или закончился лимит max_moves.
+        """
+        while not self.completed:
+            if max_moves is not None and self._moves >= max_moves:
+                return None
+            if not self.step():
+                return None
+        return self._moves
@@ -0,0 +1,174 @@
+# telemetry.py
+"""Счетчики и события решений ИИ, чтобы настраивать его не вслепую.
+
+Telemetry подключается к игре так же, как ReplayRecorder: attach() ставит его
+в game.telemetry, и симулятор сообщает о каждом решении. Без телеметрии
+game.telemetry равно None, и горячий путь платит только эту проверку.
+
+Счетчики COUNTERS копятся за игру: шаги по циклу, причины, по
+которым shortcut_limit() запретил срезки, соседи, отброшенные из-за обгона
+хвоста, и промахи планировщика. События - словари с полем "event":
+"tick" раз в sample_every ходов, "apple" на каждое яблоко (сколько ходов оно
+стоило) и "game" в конце игры (итог и все счетчики). Они копятся в буфере и
+пачками уходят в TelemetryWriter, который пишет CSV или JSON lines из
+фонового потока.
+"""
+import csv
+import json
+import queue
+import threading
+import time
+
+# Запись "tick" раз в столько ходов
+SAMPLE_EVERY = 100
+# Столько записей копится, прежде чем уйти в фоновый поток
+BATCH_SIZE = 256
+COUNTERS = (
+    "cycle_steps",  # ход по циклу (срезки считает сам симулятор, game.shortcuts)
+    "limit_no_tail",  # срезки запрещены: хвост вне поля
+    "limit_tail_margin",  # срезки запрещены: хвост ближе запаса min_distance
+    "limit_growth_margin",  # срезки запрещены только из-за еще не выросших сегментов
+    "neighbor_overtake",  # сосед головы отброшен: переход на него обогнал бы хвост
+    "plan_miss",  # планировщик не нашел путь, решал жадный выбор
+)
+FIELDS = ("event", "game", "seed", "outcome", "moves", "length", "apples", "shortcuts", "add_count",
+          "tail_distance", "moves_per_apple", "seconds") + COUNTERS
+FORMATS = ("jsonl", "csv")
+
+class TelemetryWriter:
+    """Пишет пачки записей в файл из фонового потока, формат - jsonl или csv.
+
+    Файл открывается сразу, чтобы ошибка пути была видна вызывающему.
+    """
+
+    def __init__(self, path, fmt=None):
+        if fmt is None:
+            fmt = "csv" if path.endswith(".csv") else "jsonl"
+        if fmt not in FORMATS:
+            raise ValueError(f"Неизвестный формат телеметрии {fmt}, есть: {', '.join(FORMATS)}")
+        self.path = path
+        self.format = fmt
+        self.written = 0
+        self._file = open(path, "w", newline="")
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, records):
+        """Отдает список записей фоновому потоку, не блокируя"""
+        self._queue.put(records)
+
+    def close(self):
+        """Дописывает всё, что в очереди, и закрывает файл"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        out = self._file
+        writer = None
+        if self.format == "csv":
+            writer = csv.DictWriter(out, FIELDS, restval="", extrasaction="ignore")
+            writer.writeheader()
+        try:
+            while True:
+                records = self._queue.get()
+                if records is None:
+                    break
+                if writer is not None:
+                    writer.writerows(records)
+                else:
+                    out.write("".join(json.dumps(record) + "\n" for record in records))
+                self.written += len(records)
+                # Пачка записана целиком: файл можно читать, пока игра идет
+                if self._queue.empty():
+                    out.flush()
+        except OSError as e:
+            print(f"Не удалось записать телеметрию в {self.path}: {e}")
+        finally:
+            out.close()
+
+class Telemetry:
+    def __init__(self, writer, sample_every=SAMPLE_EVERY, batch_size=BATCH_SIZE):
+        self.writer = writer
+        self.sample_every = sample_every
+        self.batch_size = batch_size
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.games = 0
+        self._buffer = []
+        self._ended = True
+        self._last_apple = 0
+        self._started = 0
+
+    def attach(self, game):
+        """Подключается к только что начатой игре"""
+        game.telemetry = self
+        self.game_start(game)
+
+    def count(self, name):
+        self.counts[name] += 1
+
+    def game_start(self, game):
+        self.games += 1
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self._ended = False
+        self._last_apple = game.moves
+        self._started = time.perf_counter()
+
+    def tick(self, game):
+        """Ход сделан. Каждый sample_every-й ход становится записью"""
+        if game.moves % self.sample_every == 0:
+            self.emit(self._record("tick", game))
+
+    def apple(self, game):
+        """Змейка съела яблоко на этом ходу"""
+        record = self._record("apple", game)
+        record["moves_per_apple"] = game.moves - self._last_apple
+        self._last_apple = game.moves
+        self.emit(record)
+
+    def game_end(self, game, outcome):
+        """Итог игры: outcome - "completed", "crash", "reset" или "exit". Повторный вызов ничего не делает"""
+        if self._ended:
+            return
+        self._ended = True
+        if not game.moves:
+            # Игра без единого хода (сброс сразу после столкновения, выход сразу после
+            # старта) не пишется, ее номер достается следующей игре
+            self.games -= 1
+            return
+        record = self._record("game", game)
+        record["seed"] = game.seed
+        record["outcome"] = outcome
+        record["seconds"] = time.perf_counter() - self._started
+        record.update(self.counts)
+        self.emit(record)
+        self.flush()
+
+    def emit(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.writer.write(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def _record(self, event, game):
+        index = game.cycle_index
+        return {
+            "event": event,
+            "game": self.games,
+            "moves": game.moves,
+            "length": len(game.snake),
+            "apples": game.apples_eaten,
+            "shortcuts": game.shortcuts,
+            "add_count": game.add_count,
+            # Сколько ходов по циклу от головы до хвоста
+            "tail_distance": index.distance(index.position(game.snake[0]), game.tail_cycle_position),
+        }
@@ -0,0 +1,28 @@
+# test_batch.py
+"""BatchSimulator должен играть ход в ход как SnakeSimulator. Запуск: python -m pytest -q"""
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from batch import compare_with_scalar
+from hamiltonial import HamiltonianCycle
+
+SEEDS = list(range(8))
+
+def make_cycle(grid_width, grid_height, seed=0):
+    return HamiltonianCycle(grid_width // 2, grid_height // 2, rng=random.Random(seed))
+
+@pytest.mark.parametrize("acceleration_mode", [True, False])
+@pytest.mark.parametrize("grid_width, grid_height", [(12, 8), (24, 16)])
+def test_default_parameters(grid_width, grid_height, acceleration_mode):
+    hamilton = make_cycle(grid_width, grid_height)
+    assert compare_with_scalar(hamilton, SEEDS, acceleration_mode) == []
+
+@pytest.mark.parametrize("acceleration_mode", [True, False])
+@pytest.mark.parametrize("min_distance, apple_growth", [(0, 1), (10, 2), (115, 4), (20, 8)])
+def test_tuned_parameters(min_distance, apple_growth, acceleration_mode):
+    hamilton = make_cycle(24, 16, seed=1)
+    assert compare_with_scalar(hamilton, SEEDS, acceleration_mode,
+                               min_distance=min_distance, apple_growth=apple_growth) == []
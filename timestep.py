@@ -0,0 +1,70 @@
+# timestep.py
+"""Фиксированный шаг симуляции, независимый от частоты кадров.
+
+FixedTimestep копит прошедшее время и отдает число тиков, которое надо
+сделать в этом кадре. Число тиков за кадр ограничено, чтобы после долгой
+паузы (окно было скрыто, отладчик) змейка не пыталась догнать всё сразу -
+лишнее время просто выбрасывается.
+"""
+import time
+from collections import deque
+
+# Больше тиков за кадр не делаем, остаток времени отбрасываем
+MAX_TICKS_PER_FRAME = 64
+# В турбо-режиме симуляция занимает столько миллисекунд каждого кадра
+TURBO_FRAME_BUDGET = 12
+# и на экран выводится только каждый N-й кадр
+TURBO_RENDER_EVERY = 4
+
+class FixedTimestep:
+    def __init__(self, interval, max_ticks=MAX_TICKS_PER_FRAME):
+        self.interval = interval
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+        self.dropped = 0
+        self._last = None
+
+    def reset(self, now=None):
+        """Начинает отсчет заново, например после того как окно снова показано"""
+        self.accumulator = 0.0
+        self._last = now
+
+    def advance(self, now):
+        """Сколько тиков сделать к моменту now (мс)"""
+        if self._last is None:
+            self._last = now
+        self.accumulator += now - self._last
+        self._last = now
+
+        ticks = int(self.accumulator // self.interval)
+        if ticks > self.max_ticks:
+            self.dropped += ticks - self.max_ticks
+            ticks = self.max_ticks
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.interval
+        return ticks
+
+class RateCounter:
+    """Частота событий (кадров, тиков) за последнюю секунду"""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._events = deque()
+        self._count = 0
+
+    def add(self, count=1, now=None):
+        now = time.perf_counter() if now is None else now
+        self._events.append((now, count))
+        self._count += count
+        self._trim(now)
+
+    def rate(self, now=None):
+        now = time.perf_counter() if now is None else now
+        self._trim(now)
+        return self._count / self.window
+
+    def _trim(self, now):
+        events = self._events
+        while events and now - events[0][0] > self.window:
+            self._count -= events.popleft()[1]
@@ -0,0 +1,194 @@
+# tuning.py
+"""Подбор запаса до хвоста и роста за яблоко под размер поля.
+
+Запуск: python tuning.py [--sizes 24x16 40x30] [--games 200] [--seed 0]
+                         [--margins 20 50 100] [--growth 2 4 8] [--workers 8]
+                         [--planner greedy] [--max-moves N] [--table tuning.json]
+                         [--output sweep.jsonl] [--dry-run]
+
+Для каждого размера поля (по умолчанию - width и height из settings.txt)
+каждая пара (min_distance, apple_growth) играет --games игр через
+montecarlo.run_games с одними и теми же seed. Пара безопасна, если выиграны
+все игры: ни столкновений, ни упора в --max-moves. Из безопасных побеждает та,
+у которой меньше медиана ходов до победы (при равенстве - p90, затем больший
+запас). Она записывается в таблицу tuning.json под ключом "<ширина>x<высота>",
+а main.py берет из таблицы параметры для размера поля из настроек. Размеры,
+для которых безопасной пары не нашлось, в таблицу не попадают.
+"""
+import json
+import os
+import sys
+import time
+
+TUNING_FILE = "tuning.json"
+# Параметры SnakeSimulator, которые хранит таблица
+PARAMETERS = ("min_distance", "apple_growth")
+# Запасы по умолчанию - доли числа клеток поля (плюс MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL)
+MARGIN_FRACTIONS = (0.02, 0.05, 0.1, 0.2, 0.3, 0.5)
+GROWTH_CHOICES = (2, 4, 8)
+
+def size_key(grid_width, grid_height):
+    return f"{grid_width}x{grid_height}"
+
+def load_tuning(path=TUNING_FILE):
+    """Таблица из файла или пустая, если файла нет или он испорчен"""
+    try:
+        with open(path, "r") as f:
+            table = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Не удалось прочитать {path}: {e}")
+        return {}
+    if not isinstance(table, dict):
+        print(f"В {path} ожидается словарь размеров поля")
+        return {}
+    return table
+
+def tuned_parameters(table, grid_width, grid_height):
+    """Аргументы SnakeSimulator для этого размера поля: пустой словарь, если размера нет в таблице"""
+    entry = table.get(size_key(grid_width, grid_height))
+    if not isinstance(entry, dict):
+        return {}
+    params = {name: entry[name] for name in PARAMETERS if name in entry}
+    min_distance = params.get("min_distance", 0)
+    apple_growth = params.get("apple_growth", 1)
+    if not (type(min_distance) is int and type(apple_growth) is int and min_distance >= 0 and apple_growth >= 1):
+        print(f"Негодные параметры для поля {size_key(grid_width, grid_height)}: {params}")
+        return {}
+    return params
+
+def default_margins(grid_width, grid_height):
+    """Запасы для перебора: доли MARGIN_FRACTIONS от числа клеток и запас по умолчанию"""
+    from simulator import MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL
+    cells = grid_width * grid_height
+    margins = {max(1, int(cells * fraction)) for fraction in MARGIN_FRACTIONS}
+    margins.add(MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL)
+    return sorted(margins)
+
+def sweep(grid_width, grid_height, margins, growths, games, base_seed=0, workers=None,
+          planner="greedy", max_moves=None):
+    """Играет games игр на каждую пару (запас, рост). Отдает по строке на пару по мере готовности"""
+    from montecarlo import run_games, summarize
+
+    for apple_growth in growths:
+        for min_distance in margins:
+            start = time.perf_counter()
+            results = list(run_games(games, grid_width, grid_height, base_seed, workers,
+                                     max_moves=max_moves, planner=planner,
+                                     min_distance=min_distance, apple_growth=apple_growth))
+            summary = summarize(results)
+            crashes = sum(r["crashed"] for r in results)
+            yield {
+                "size": size_key(grid_width, grid_height),
+                "min_distance": min_distance,
+                "apple_growth": apple_growth,
+                "games": summary["games"],
+                "wins": summary["wins"],
+                "crashes": crashes,
+                # Не разбились, но и не успели за max_moves
+                "timeouts": summary["games"] - summary["wins"] - crashes,
+                "moves_p50": summary["moves_p50"],
+                "moves_p90": summary["moves_p90"],
+                "moves_p99": summary["moves_p99"],
+                "seconds": time.perf_counter() - start,
+            }
+
+def best_row(rows):
+    """Безопасная пара с наименьшей медианой ходов или None"""
+    safe = [row for row in rows if row["games"] and row["wins"] == row["games"]]
+    if not safe:
+        return None
+    return min(safe, key=lambda row: (row["moves_p50"], row["moves_p90"], -row["min_distance"]))
+
+def save_tuning(path, key, entry):
+    """Записывает entry под ключом key, остальные размеры в таблице сохраняются"""
+    table = load_tuning(path)
+    table[key] = entry
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(table, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def parse_size(text):
+    from config import MIN_GRID_SIZE
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Размер поля ожидается как ШИРИНАxВЫСОТА, а не {text!r}")
+    if width < MIN_GRID_SIZE or height < MIN_GRID_SIZE or width % 2 or height % 2:
+        raise ValueError(f"Ширина и высота должны быть четными и не меньше {MIN_GRID_SIZE}: {text}")
+    return width, height
+
+def main():
+    import argparse
+    from config import Config, SETTINGS_FILE
+    from simulator import PLANNERS, MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL, APPLE_GROWTH
+
+    parser = argparse.ArgumentParser(description="Подбор min_distance и apple_growth под размер поля")
+    parser.add_argument("--sizes", nargs="+", help="размеры ШИРИНАxВЫСОТА (по умолчанию из settings.txt)")
+    parser.add_argument("--games", type=int, default=200, help="игр на каждую пару параметров")
+    parser.add_argument("--seed", type=int, default=0, help="seed первой игры")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--margins", type=int, nargs="+", help="запасы до хвоста (по умолчанию доли поля)")
+    parser.add_argument("--growth", type=int, nargs="+", default=GROWTH_CHOICES, help="сегментов за яблоко")
+    parser.add_argument("--planner", choices=PLANNERS, default="greedy", help="стратегия срезок")
+    parser.add_argument("--max-moves", type=int, default=None, help="игра дольше считается проигранной")
+    parser.add_argument("--table", default=TUNING_FILE, help="куда записать лучшие параметры")
+    parser.add_argument("--output", help="файл JSON lines со строкой на каждую пару")
+    parser.add_argument("--dry-run", action="store_true", help="только напечатать, таблицу не менять")
+    args = parser.parse_args()
+
+    if args.games < 1:
+        parser.error("--games должно быть больше нуля")
+    if any(margin < 0 for margin in args.margins or ()) or any(growth < 1 for growth in args.growth):
+        parser.error("запас не может быть отрицательным, а рост должен быть не меньше 1")
+    try:
+        if args.sizes:
+            sizes = [parse_size(size) for size in args.sizes]
+        else:
+            settings = Config(SETTINGS_FILE).get()
+            sizes = [(settings["width"], settings["height"])]
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.output, "w") if args.output else None
+    failed = False
+    try:
+        for grid_width, grid_height in sizes:
+            key = size_key(grid_width, grid_height)
+            margins = args.margins or default_margins(grid_width, grid_height)
+            rows = []
+            for row in sweep(grid_width, grid_height, margins, args.growth, args.games, args.seed,
+                             args.workers, args.planner, args.max_moves):
+                rows.append(row)
+                if out:
+                    out.write(json.dumps(row) + "\n")
+                print(f"{key} min_distance={row['min_distance']} apple_growth={row['apple_growth']}: "
+                      f"побед {row['wins']}/{row['games']}, столкновений {row['crashes']}, "
+                      f"не успели {row['timeouts']}, ходов p50 {row['moves_p50']} p90 {row['moves_p90']}",
+                      file=sys.stderr)
+
+            best = best_row(rows)
+            if best is None:
+                print(f"{key}: безопасных параметров не нашлось, таблица не меняется")
+                failed = True
+                continue
+            entry = {name: best[name] for name in PARAMETERS}
+            entry.update(games=best["games"], seed=args.seed, planner=args.planner,
+                         moves_p50=best["moves_p50"], moves_p90=best["moves_p90"])
+            # С чем сравнивать: параметры по умолчанию, если они были в переборе
+            for row in rows:
+                if (row["min_distance"], row["apple_growth"]) == (MIN_DISTANCE_BETWEEN_HEAD_AND_TAIL, APPLE_GROWTH):
+                    entry.update(default_wins=row["wins"], default_moves_p50=row["moves_p50"])
+            print(f"{key}: {json.dumps(entry)}")
+            if not args.dry_run:
+                save_tuning(args.table, key, entry)
+    finally:
+        if out:
+            out.close()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()